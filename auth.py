@@ -1,12 +1,25 @@
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from models import Department, User
+from models import User
 from schemas import UserCreate, UserLogin, TokenData
-from database import get_db
-from security import get_password_hash, verify_password, create_access_token
+from database import get_async_db, get_db
+from security import (
+    PasswordHashingBusyError,
+    create_access_token,
+    get_password_hash_async,
+    verify_and_update_password_async,
+)
 from datetime import timedelta
 from jose import JWTError, jwt
+from cache import TTLCache
+import refdata
+import os
+import threading
+import time
 
 router = APIRouter()
 
@@ -15,13 +28,37 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 SECRET_KEY = "your_secret_key"
 ALGORITHM = "HS256"
 
+# Verified principals keyed by the raw token. Entries never outlive the
+# token's own expiry, and are capped at AUTH_CACHE_TTL seconds so that a
+# revocation made by another worker process is picked up within that window.
+principal_cache = TTLCache(
+    maxsize=int(os.getenv("AUTH_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("AUTH_CACHE_TTL", "300")),
+)
+
+# Latest token_version seen per username in this process. A cached principal
+# issued under an older version is treated as revoked.
+_user_token_versions = {}
+_user_token_versions_lock = threading.Lock()
+
+
+def _note_token_version(username: str, version: int) -> None:
+    with _user_token_versions_lock:
+        if version > _user_token_versions.get(username, version - 1):
+            _user_token_versions[username] = version
+
+def _hashing_busy(e: PasswordHashingBusyError) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+
+
 @router.post("/register/")
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
+async def register_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     
-    db_user = db.query(User).filter(User.email == user.email).first()
-    db_user1 = db.query(User).filter(User.username == user.username).first()
-    department = db.query(Department).filter(Department.department_code == user.department_code).first()
-    if not department:
+    db_user = await db.scalar(select(User).where(User.email == user.email))
+    db_user1 = await db.scalar(select(User).where(User.username == user.username))
+    # A miss may reload the reference data, so look it up off the event loop
+    references = await run_in_threadpool(refdata.covering, departments=[user.department_code])
+    if references.department(user.department_code) is None:
         raise HTTPException(status_code=400, detail="Invalid department_id: Department does not exist")
     if db_user1:
         raise HTTPException(status_code=400, detail="user already registered")
@@ -29,7 +66,10 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
-    hashed_password = get_password_hash(user.password)
+    try:
+        hashed_password = await get_password_hash_async(user.password)
+    except PasswordHashingBusyError as e:
+        raise _hashing_busy(e)
 
     new_user = User(
         username=user.username,
@@ -40,19 +80,36 @@ def register_user(user: UserCreate, db: Session = Depends(get_db)):
     ) 
 
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
+    await db.refresh(new_user)
 
     return {"message": "User registered successfully", "user_id": new_user.id}
 
 @router.post("/login/")
-def login(user: UserLogin, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if not db_user or not verify_password(user.password, db_user.hashed_password):
+async def login(user: UserLogin, db: AsyncSession = Depends(get_async_db)):
+    db_user = await db.scalar(select(User).where(User.email == user.email))
+    if not db_user:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    try:
+        verified, new_hash = await verify_and_update_password_async(user.password, db_user.hashed_password)
+    except PasswordHashingBusyError as e:
+        raise _hashing_busy(e)
+    if not verified:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
+    # Stored hash used an outdated cost factor; keep the upgraded one
+    if new_hash is not None:
+        db_user.hashed_password = new_hash
+        await db.commit()
+
     access_token = create_access_token(
-        data={"sub": db_user.username, "role": db_user.role, "department_code": db_user.department_code},
+        data={
+            "sub": db_user.username,
+            "role": db_user.role,
+            "department_code": db_user.department_code,
+            "ver": db_user.token_version
+        },
         expires_delta=timedelta(minutes=30)
     )
 
@@ -61,20 +118,38 @@ def login(user: UserLogin, db: Session = Depends(get_db)):
 
     
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    cached = principal_cache.get(token)
+    if cached is not None:
+        principal, version = cached
+        if _user_token_versions.get(principal["username"], version) == version:
+            return principal
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         role: str = payload.get("role")
         department_code: int = payload.get("department_code")
+        # Tokens issued before token versions existed carry none
+        version: int = payload.get("ver", 0)
 
         if username is None or role is None or department_code is None:
             raise HTTPException(status_code=401, detail="Invalid token data")
 
-        user = db.query(User).filter(User.username == username).first()
+        user = db.query(User.token_version).filter(User.username == username).first()
         if user is None:
             raise HTTPException(status_code=401, detail="User not found")
-       
-        return {"username": username, "role": role, "department_code": department_code}
+
+        _note_token_version(username, user.token_version)
+        if version != user.token_version:
+            raise HTTPException(status_code=401, detail="Token has been revoked")
+
+        principal = {"username": username, "role": role, "department_code": department_code}
+        principal_cache.set(
+            token,
+            (principal, version),
+            ttl=min(principal_cache.ttl, payload["exp"] - time.time())
+        )
+        return principal
 
     except JWTError:
         raise HTTPException(
@@ -84,4 +159,28 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         )
 
     # except JWTError:
-    #     raise HTTPException(status_code=403, detail="Could not validate credentials")
\ No newline at end of file
+    #     raise HTTPException(status_code=403, detail="Could not validate credentials")
+
+
+@router.post("/logout/")
+def logout(
+    token: str = Depends(oauth2_scheme),
+    current_user: dict = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """Revoke every token issued to the current user, on all devices."""
+    user = db.query(User).filter(User.username == current_user["username"]).first()
+    user.token_version = (user.token_version or 0) + 1
+    db.commit()
+
+    _note_token_version(user.username, user.token_version)
+    principal_cache.pop(token)
+    return {"message": "Logged out successfully"}
+
+
+@router.get("/auth/cache/stats")
+def get_auth_cache_stats(current_user: dict = Depends(get_current_user)):
+    """Hit/miss counters and occupancy of the verified-principal cache. HR only."""
+    if current_user["role"] != "HR":
+        raise HTTPException(status_code=403, detail="Only HR can view the auth cache")
+    return principal_cache.stats()
@@ -0,0 +1,194 @@
+# benchmarks/datagen.py
+#
+# Synthetic data for the benchmarks: a database seeded at a configurable
+# scale and assessment workbooks in the layout excel_parser expects.
+# Importing this module imports the app's models, so DATABASE_URL must be
+# set first if the app is going to be imported in the same process.
+import os
+import random
+import sys
+from typing import Dict, List, Optional
+
+import openpyxl
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from database import Base, create_db_engine  # noqa: E402
+from models import (  # noqa: E402
+    Competency,
+    Department,
+    Employee,
+    EmployeeCompetency,
+    Role,
+    RoleCompetency,
+    User,
+)
+import gap_summary  # noqa: E402
+
+INSERT_BATCH_SIZE = 10000
+
+# Default share of employee competencies per gap (required - actual);
+# "unscored" rows have no actual score yet
+DEFAULT_GAP_WEIGHTS = {"unscored": 0.2, "-1": 0.1, "0": 0.3, "1": 0.2, "2": 0.12, "3": 0.08}
+
+HR_USERNAME = "bench-hr"
+HOD_USERNAME = "bench-hod"
+
+
+def parse_gap_weights(spec: Optional[str]) -> Dict[str, float]:
+    """Parse "unscored:0.2,0:0.5,1:0.3" into a weights dict."""
+    if not spec:
+        return dict(DEFAULT_GAP_WEIGHTS)
+    weights = {}
+    for part in spec.split(","):
+        key, _, value = part.partition(":")
+        weights[key.strip()] = float(value)
+    return weights
+
+
+def department_code(i: int) -> str:
+    return f"D{i:03d}"
+
+
+def role_code(i: int) -> str:
+    return f"R{i:03d}"
+
+
+def competency_code(i: int) -> str:
+    return f"C{i:04d}"
+
+
+def employee_number(i: int) -> str:
+    return f"E{i:08d}"
+
+
+def _insert(db: Session, model, rows: List[dict]) -> None:
+    for start in range(0, len(rows), INSERT_BATCH_SIZE):
+        db.execute(insert(model.__table__), rows[start:start + INSERT_BATCH_SIZE])
+
+
+def seed_database(
+    url: str,
+    departments: int = 10,
+    roles: int = 20,
+    competencies: int = 60,
+    competencies_per_role: int = 12,
+    employees: int = 10000,
+    gap_weights: Optional[Dict[str, float]] = None,
+    seed: int = 1,
+) -> dict:
+    """
+    Create the schema in `url` (expected to be empty) and fill it. Returns
+    the role -> competency codes map and the employees' roles, which the
+    benchmark scenarios use to build requests.
+    """
+    rng = random.Random(seed)
+    gap_weights = gap_weights or DEFAULT_GAP_WEIGHTS
+    gap_values = list(gap_weights)
+    gap_probabilities = [gap_weights[key] for key in gap_values]
+
+    engine = create_db_engine(url)
+    Base.metadata.create_all(bind=engine)
+
+    role_competencies: Dict[str, List[str]] = {}
+    required_scores = {competency_code(i): rng.randint(2, 5) for i in range(competencies)}
+    for r in range(roles):
+        codes = rng.sample(sorted(required_scores), min(competencies_per_role, competencies))
+        role_competencies[role_code(r)] = codes
+
+    employee_roles: Dict[str, str] = {}
+    with Session(engine) as db:
+        _insert(db, Department, [
+            {"department_code": department_code(d), "name": f"Department {d}"} for d in range(departments)
+        ])
+        _insert(db, Role, [{"role_code": role_code(r), "name": f"Role {r}"} for r in range(roles)])
+        _insert(db, Competency, [
+            {"code": code, "name": f"Competency {code}", "description": None, "required_score": score}
+            for code, score in required_scores.items()
+        ])
+        _insert(db, RoleCompetency, [
+            {"role_code": role, "competency_code": code, "required_score": required_scores[code]}
+            for role, codes in role_competencies.items() for code in codes
+        ])
+        _insert(db, User, [
+            {"username": HR_USERNAME, "email": "hr@bench.local", "hashed_password": "-",
+             "role": "HR", "department_code": department_code(0), "token_version": 0},
+            {"username": HOD_USERNAME, "email": "hod@bench.local", "hashed_password": "-",
+             "role": "HOD", "department_code": department_code(0), "token_version": 0},
+        ])
+
+        employee_rows, competency_rows = [], []
+        for e in range(employees):
+            number = employee_number(e)
+            role = role_code(rng.randrange(roles))
+            employee_roles[number] = role
+            scored = False
+            for code in role_competencies[role]:
+                gap = rng.choices(gap_values, weights=gap_probabilities)[0]
+                required = required_scores[code]
+                actual = None if gap == "unscored" else max(0, min(5, required - int(gap)))
+                scored = scored or actual is not None
+                competency_rows.append({
+                    "employee_number": number, "competency_code": code,
+                    "required_score": required, "actual_score": actual,
+                })
+            employee_rows.append({
+                "employee_number": number,
+                "employee_name": f"Employee {e}",
+                "job_code": f"J{e % 97:03d}",
+                "reporting_employee_name": f"Manager {e % 50}",
+                "role_code": role,
+                "department_code": department_code(rng.randrange(departments)),
+                "evaluation_status": scored,
+                "evaluation_by": HR_USERNAME if scored else None,
+                "last_evaluated_date": None,
+            })
+            if len(competency_rows) >= INSERT_BATCH_SIZE:
+                _insert(db, EmployeeCompetency, competency_rows)
+                competency_rows = []
+        _insert(db, Employee, employee_rows)
+        _insert(db, EmployeeCompetency, competency_rows)
+
+        gap_summary.rebuild(db)
+        db.commit()
+
+    engine.dispose()
+    return {"role_competencies": role_competencies, "employee_roles": employee_roles}
+
+
+def write_workbook(
+    path: str,
+    sheets: int,
+    role_competencies: Dict[str, List[str]],
+    departments: int,
+    first_employee: int,
+    seed: int = 1,
+) -> List[str]:
+    """
+    Write an upload workbook with one employee per sheet, numbered from
+    `first_employee`, and return the employee numbers.
+    """
+    rng = random.Random(seed)
+    roles = sorted(role_competencies)
+    workbook = openpyxl.Workbook(write_only=True)
+    numbers = []
+
+    for i in range(first_employee, first_employee + sheets):
+        number = employee_number(i)
+        numbers.append(number)
+        role = rng.choice(roles)
+        sheet = workbook.create_sheet(f"S{i}")
+        sheet.append(["Employee Number", number])
+        sheet.append(["Employee Name", f"Uploaded {i}", None, "Job Code", f"J{i % 97:03d}"])
+        sheet.append(["Reporting Employee Name", f"Manager {i % 50}"])
+        sheet.append(["Role Code", role, "Department & Cost Centre", department_code(rng.randrange(departments))])
+        sheet.append(["Assessment mode", "RPL/APL"])
+        sheet.append(["No", "Code", "Score", "RPL/APL"])
+        sheet.append(["Functional competencies"])
+        for n, code in enumerate(role_competencies[role], start=1):
+            sheet.append([n, code, f"{rng.randint(1, 5)}/5"])
+
+    workbook.save(path)
+    return numbers
@@ -0,0 +1,102 @@
+# benchmarks/gap_analysis_benchmark.py
+#
+# Compares the per-row Python gap loops the analytics endpoints used to run
+# with the vectorised gap_analysis core, on synthetic score rows.
+#
+#   python benchmarks/gap_analysis_benchmark.py [--rows 1000000]
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from gap_analysis import GapFrame, gap_statistics  # noqa: E402
+
+
+def synthetic_rows(rows: int, departments: int, competencies: int, seed: int) -> tuple:
+    """Score rows as (records, GapFrame): the same data for both versions."""
+    rng = np.random.default_rng(seed)
+    department = rng.integers(0, departments, rows)
+    competency = rng.integers(0, competencies, rows)
+    required = rng.integers(1, 6, rows)
+    actual = np.clip(required - rng.integers(-1, 4, rows), 0, 5)
+    scored = rng.random(rows) > 0.1
+    frame = GapFrame(
+        department=department,
+        department_codes=[f"D{i:03d}" for i in range(departments)],
+        competency=competency,
+        competency_codes=[f"C{i:03d}" for i in range(competencies)],
+        gap=required - actual,
+        scored=scored,
+    )
+    records = [
+        (
+            frame.department_codes[department[i]],
+            frame.competency_codes[competency[i]],
+            int(required[i]) if scored[i] else None,
+            int(actual[i]) if scored[i] else None,
+        )
+        for i in range(rows)
+    ]
+    return records, frame
+
+
+def loop_analysis(records: list) -> tuple:
+    """The row-at-a-time version: bucket counts per department and competency."""
+    department_gaps, competency_gaps = {}, {}
+    for dept, comp, required, actual in records:
+        if required is None or actual is None:
+            continue
+        gap = required - actual
+        if gap in (1, 2, 3):
+            department_gaps.setdefault(dept, [0, 0, 0])[gap - 1] += 1
+            competency_gaps.setdefault(comp, [0, 0, 0])[gap - 1] += 1
+    return department_gaps, competency_gaps
+
+
+def vectorised_analysis(frame: GapFrame) -> tuple:
+    return frame.gap_histogram("department"), frame.gap_histogram("competency")
+
+
+def best_of(repeat: int, fn, *args):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the gap analytics core")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--departments", type=int, default=40)
+    parser.add_argument("--competencies", type=int, default=120)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    records, frame = synthetic_rows(args.rows, args.departments, args.competencies, args.seed)
+
+    loop_time, (dept_loop, comp_loop) = best_of(args.repeat, loop_analysis, records)
+    vector_time, (dept_hist, comp_hist) = best_of(args.repeat, vectorised_analysis, frame)
+    stats_time, _ = best_of(args.repeat, gap_statistics, frame, "competency")
+
+    # Both versions must agree before their timings mean anything
+    for histogram, codes, expected in (
+        (dept_hist, frame.department_codes, dept_loop),
+        (comp_hist, frame.competency_codes, comp_loop),
+    ):
+        assert {code: list(map(int, histogram[i])) for i, code in enumerate(codes) if histogram[i].any()} == expected
+
+    print(f"rows                     {args.rows:>12,}")
+    print(f"python loop              {loop_time * 1000:>10.1f} ms")
+    print(f"numpy histograms         {vector_time * 1000:>10.1f} ms  ({loop_time / vector_time:.1f}x)")
+    print(f"numpy full statistics    {stats_time * 1000:>10.1f} ms  (histogram, mean, p50/p75/p90)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,309 @@
+# benchmarks/run_benchmarks.py
+#
+# End-to-end benchmark of the API's hot paths. Seeds a fresh SQLite database
+# at the requested scale, imports the app against it and drives the
+# endpoints in-process through httpx's ASGI transport, so the numbers cover
+# routing, validation, the ORM and the database but no network.
+#
+#   python benchmarks/run_benchmarks.py --employees 20000 --output bench.json
+#   python benchmarks/run_benchmarks.py --employees 20000 --compare bench.json
+#
+# Every scenario reports p50/p95/p99 latency, throughput and the mean number
+# of database statements per request (from the Server-Timing header).
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+import numpy as np
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+
+SCENARIOS = ("list", "list-hod", "analytics", "evaluation", "evaluation-batch", "upload")
+
+_SERVER_TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+_SERVER_TIMING_DB = re.compile(r"db;dur=([\d.]+)")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the API's hot paths in-process")
+    scale = parser.add_argument_group("data scale")
+    scale.add_argument("--departments", type=int, default=10)
+    scale.add_argument("--roles", type=int, default=20)
+    scale.add_argument("--competencies", type=int, default=60)
+    scale.add_argument("--scores-per-employee", type=int, default=12,
+                       help="competencies per role, so scores per employee")
+    scale.add_argument("--employees", type=int, default=10000)
+    scale.add_argument("--gap-weights", default=None,
+                       help='share of scores per gap, e.g. "unscored:0.2,0:0.4,1:0.2,2:0.1,3:0.1"')
+    scale.add_argument("--seed", type=int, default=1)
+
+    run = parser.add_argument_group("run")
+    run.add_argument("--scenarios", default=",".join(SCENARIOS),
+                     help=f"comma-separated subset of {', '.join(SCENARIOS)}")
+    run.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    run.add_argument("--concurrency", type=int, default=1)
+    run.add_argument("--batch-size", type=int, default=50, help="employees per evaluation-batch request")
+    run.add_argument("--upload-runs", type=int, default=3)
+    run.add_argument("--upload-sheets", type=int, default=500)
+    run.add_argument("--warm-cache", action="store_true",
+                     help="keep the analytics response cache between requests (default: cold)")
+    run.add_argument("--database", default=None, help="SQLite file to create (default: a temporary file)")
+
+    output = parser.add_argument_group("output")
+    output.add_argument("--output", help="write results as JSON to this file")
+    output.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    return parser.parse_args(argv)
+
+
+def summarize(latencies: List[float], queries: List[int], db_ms: List[float], errors: int, wall: float) -> dict:
+    values = np.array(latencies) * 1000 if latencies else np.zeros(1)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(float(np.percentile(values, 50)), 3),
+        "p95_ms": round(float(np.percentile(values, 95)), 3),
+        "p99_ms": round(float(np.percentile(values, 99)), 3),
+        "mean_ms": round(float(values.mean()), 3),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else None,
+        "queries_per_request": round(float(np.mean(queries)), 2) if queries else None,
+        "db_ms_per_request": round(float(np.mean(db_ms)), 3) if db_ms else None,
+    }
+
+
+async def run_requests(
+    count: int,
+    concurrency: int,
+    send: Callable[[int], Awaitable],
+    before: Optional[Callable[[], None]] = None,
+) -> dict:
+    """Issue `count` requests via `send(i)`, at most `concurrency` at a time."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, queries, db_ms = [], [], []
+    errors = 0
+
+    async def one(i: int) -> None:
+        nonlocal errors
+        async with semaphore:
+            if before is not None:
+                before()
+            start = time.perf_counter()
+            response = await send(i)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+            timing = response.headers.get("server-timing", "")
+            if _SERVER_TIMING_QUERIES.search(timing):
+                queries.append(int(_SERVER_TIMING_QUERIES.search(timing).group(1)))
+                db_ms.append(float(_SERVER_TIMING_DB.search(timing).group(1)))
+
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(count)))
+    return summarize(latencies, queries, db_ms, errors, time.perf_counter() - wall_start)
+
+
+async def run_scenarios(args: argparse.Namespace, data: dict) -> Dict[str, dict]:
+    import httpx
+
+    import main
+    import security
+    import stats
+    from datagen import HOD_USERNAME, HR_USERNAME, department_code, write_workbook
+
+    def token(username: str, role: str) -> dict:
+        access_token = security.create_access_token(
+            {"sub": username, "role": role, "department_code": department_code(0), "ver": 0},
+            timedelta(hours=2),
+        )
+        return {"Authorization": f"Bearer {access_token}"}
+
+    hr, hod = token(HR_USERNAME, "HR"), token(HOD_USERNAME, "HOD")
+    rng = random.Random(args.seed)
+    employees = sorted(data["employee_roles"])
+    competency_codes = sorted({code for codes in data["role_competencies"].values() for code in codes})
+    selected = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    results: Dict[str, dict] = {}
+
+    def scores_for(number: str) -> List[dict]:
+        return [
+            {"competency_code": code, "actual_score": rng.randint(0, 5)}
+            for code in data["role_competencies"][data["employee_roles"][number]]
+        ]
+
+    async with main.app.router.lifespan_context(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+
+            if "list" in selected:
+                cursors = [None]
+
+                async def list_page(i):
+                    params = {"limit": 100}
+                    if cursors[-1]:
+                        params["cursor"] = cursors[-1]
+                    response = await client.get("/employees", params=params, headers=hr)
+                    cursors.append(response.headers.get("x-next-cursor"))
+                    return response
+
+                results["list"] = await run_requests(args.requests, 1, list_page)
+
+            if "list-hod" in selected:
+                results["list-hod"] = await run_requests(
+                    args.requests, args.concurrency,
+                    lambda i: client.get("/employees", params={"limit": 100, "include_total": "false"}, headers=hod),
+                )
+
+            if "analytics" in selected:
+                paths = ["/analytics/dashboard", "/analytics/by-competency", "/analytics/gap-statistics"]
+                paths += [f"/analytics/details/by-competency/{code}" for code in competency_codes[:5]]
+                clear = None if args.warm_cache else stats.analytics_cache.clear
+                results["analytics"] = await run_requests(
+                    args.requests, args.concurrency,
+                    lambda i: client.get(paths[i % len(paths)], headers=hr),
+                    before=clear,
+                )
+
+            if "evaluation" in selected:
+                results["evaluation"] = await run_requests(
+                    args.requests, args.concurrency,
+                    lambda i: client.post("/evaluations", headers=hr, json={
+                        "employee_number": employees[i % len(employees)],
+                        "evaluator_id": HR_USERNAME,
+                        "scores": scores_for(employees[i % len(employees)]),
+                    }),
+                )
+
+            if "evaluation-batch" in selected:
+                def batch_request(i):
+                    numbers = rng.sample(employees, min(args.batch_size, len(employees)))
+                    return client.post("/evaluations/batch", headers=hr, json={
+                        "evaluations": [{"employee_number": n, "scores": scores_for(n)} for n in numbers]
+                    })
+
+                results["evaluation-batch"] = await run_requests(
+                    max(1, args.requests // 10), args.concurrency, batch_request
+                )
+                results["evaluation-batch"]["employees_per_request"] = args.batch_size
+
+            if "upload" in selected:
+                with tempfile.TemporaryDirectory() as workdir:
+                    workbooks = []
+                    for run in range(args.upload_runs):
+                        path = os.path.join(workdir, f"upload-{run}.xlsx")
+                        write_workbook(
+                            path, args.upload_sheets, data["role_competencies"], args.departments,
+                            first_employee=args.employees + run * args.upload_sheets, seed=args.seed + run,
+                        )
+                        with open(path, "rb") as f:
+                            workbooks.append(f.read())
+
+                    async def upload(i):
+                        response = await client.post(
+                            "/employees/upload-excel",
+                            files={"file": ("bench.xlsx", workbooks[i], "application/octet-stream")},
+                        )
+                        status_url = response.json()["status_url"]
+                        while True:
+                            job = await client.get(status_url)
+                            if job.json()["status"] in ("completed", "failed"):
+                                return job
+                            await asyncio.sleep(0.01)
+
+                    results["upload"] = await run_requests(args.upload_runs, 1, upload)
+                    results["upload"]["sheets_per_request"] = args.upload_sheets
+                    # Query counts cover the submit and poll requests, not the job itself
+                    results["upload"]["queries_per_request"] = None
+                    results["upload"]["db_ms_per_request"] = None
+
+    return results
+
+
+def compare(results: Dict[str, dict], baseline_path: str) -> None:
+    with open(baseline_path) as f:
+        baseline = json.load(f)["scenarios"]
+    print(f"\n{'scenario':<18}{'metric':<10}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, current in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        for metric in ("p50_ms", "p95_ms", "p99_ms"):
+            old, new = before[metric], current[metric]
+            change = f"{(new - old) / old * 100:+.1f}%" if old else "-"
+            print(f"{name:<18}{metric:<10}{old:>12.2f}{new:>12.2f}{change:>10}")
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+
+    database = args.database or os.path.join(tempfile.mkdtemp(prefix="bench-"), "bench.db")
+    if os.path.exists(database):
+        sys.exit(f"{database} already exists; the benchmark needs a fresh database")
+    # Must be set before the app's modules are imported
+    os.environ["DATABASE_URL"] = f"sqlite:///{database}"
+    sys.path.insert(0, REPO_DIR)
+    sys.path.insert(0, BENCHMARK_DIR)
+    from datagen import parse_gap_weights, seed_database
+
+    seed_start = time.perf_counter()
+    data = seed_database(
+        os.environ["DATABASE_URL"],
+        departments=args.departments,
+        roles=args.roles,
+        competencies=args.competencies,
+        competencies_per_role=args.scores_per_employee,
+        employees=args.employees,
+        gap_weights=parse_gap_weights(args.gap_weights),
+        seed=args.seed,
+    )
+    print(f"seeded {args.employees} employees in {time.perf_counter() - seed_start:.1f}s ({database})")
+
+    results = asyncio.run(run_scenarios(args, data))
+
+    print(f"\n{'scenario':<18}{'requests':>9}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'queries':>9}")
+    for name, result in results.items():
+        queries = result["queries_per_request"]
+        print(
+            f"{name:<18}{result['requests']:>9}{result['errors']:>8}{result['p50_ms']:>10.2f}"
+            f"{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}{result['throughput_rps']:>10.1f}"
+            f"{queries if queries is not None else '-':>9}"
+        )
+
+    if args.compare:
+        compare(results, args.compare)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({
+                "meta": {
+                    "timestamp": datetime.utcnow().isoformat(),
+                    "git_revision": git_revision(),
+                    "python": platform.python_version(),
+                    "platform": platform.platform(),
+                    "args": vars(args),
+                },
+                "scenarios": results,
+            }, f, indent=2)
+        print(f"\nresults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
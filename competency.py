@@ -1,12 +1,19 @@
-from datetime import datetime
+import os
+from datetime import date, datetime
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
+from typing import Dict, List, Optional
 
 from auth import get_current_user
-from database import get_db
+from database import get_async_db, get_db
 from models import Competency, Department, Employee, EmployeeCompetency
 from schemas import CompetencyCreate, CompetencyResponse, EmployeeCompetencyResponse
+import evaluation_history
+import gap_summary
+import refdata
+from cache import bump_data_version
 import schemas
 
 router = APIRouter()
@@ -31,14 +38,16 @@ def create_competency(
     
     db.add(new_competency)
     db.commit()
+    refdata.refresh(db)
+    bump_data_version()
     db.refresh(new_competency)
     
     return new_competency
 
 
 @router.get("/competency", response_model=List[CompetencyResponse])
-def get_all_competencies(db: Session = Depends(get_db),current_user: dict = Depends(get_current_user)):
-    return db.query(Competency).all()
+async def get_all_competencies(db: AsyncSession = Depends(get_async_db),current_user: dict = Depends(get_current_user)):
+    return (await db.execute(select(Competency))).scalars().all()
 
 
 @router.put("/competency/{competency_id}", response_model=CompetencyResponse)
@@ -63,6 +72,8 @@ def update_competency(
     db_competency.required_score = competency.required_score
 
     db.commit()
+    refdata.refresh(db)
+    bump_data_version()
     db.refresh(db_competency)
     
     return db_competency
@@ -76,26 +87,33 @@ def delete_competency(competency_id: int, db: Session = Depends(get_db),current_
     
     db.delete(competency)
     db.commit()
+    refdata.refresh(db)
+    bump_data_version()
     return {"message": "Competency deleted successfully"}
 
 
 
 @router.get("/employee-competencies/{employee_number}")
-def get_employee_competencies(
+async def get_employee_competencies(
     employee_number: str,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user)
 ):
-    if not db.query(Employee).filter(Employee.employee_number == employee_number).first():
+    employee = await db.scalar(
+        select(Employee.employee_number).where(Employee.employee_number == employee_number)
+    )
+    if employee is None:
         raise HTTPException(status_code=404, detail="Employee not found")
     
-    competencies = db.query(
-        EmployeeCompetency.competency_code,
-        EmployeeCompetency.required_score,
-        EmployeeCompetency.actual_score
-    ).filter(
-        EmployeeCompetency.employee_number == employee_number
-    ).all()
+    competencies = (await db.execute(
+        select(
+            EmployeeCompetency.competency_code,
+            EmployeeCompetency.required_score,
+            EmployeeCompetency.actual_score
+        ).where(
+            EmployeeCompetency.employee_number == employee_number
+        )
+    )).all()
     
     return [{
         "code": comp.competency_code,
@@ -122,6 +140,10 @@ def submit_evaluation(
     employee = db.query(Employee).filter(Employee.employee_number == employee_number).first()
     if not employee:
         raise HTTPException(status_code=404, detail="Employee not found")
+
+    summary_before = gap_summary.employee_contributions(db, [employee_number])
+    evaluated_at = datetime.utcnow()
+    history_rows = []
     
     # Process each competency score
     for score in evaluation_data["scores"]:
@@ -137,8 +159,13 @@ def submit_evaluation(
         if competency:
             # Update existing record
             competency.actual_score = score["actual_score"]
-            competency.last_updated = datetime.utcnow()
-            competency.updated_by = evaluator_id
+            history_rows.append({
+                "employee_number": employee_number,
+                "department_code": employee.department_code,
+                "competency_code": competency.competency_code,
+                "required_score": competency.required_score,
+                "actual_score": competency.actual_score
+            })
         # else:
         #     # Create new record
         #     new_competency = EmployeeCompetency(
@@ -154,9 +181,20 @@ def submit_evaluation(
     # Update employee evaluation status
     employee.evaluation_status = True
     employee.evaluation_by = evaluator_id
-    employee.last_evaluated_date = datetime.utcnow()
+    employee.last_evaluated_date = evaluated_at
+
+    # Keep the submitted scores; an optional "cycle" overrides the date-derived review cycle
+    evaluation_history.record_evaluations(
+        db, history_rows, evaluator_id, evaluated_at, evaluation_data.get("cycle")
+    )
+
+    db.flush()
+    gap_summary.apply_changes(
+        db, summary_before, gap_summary.employee_contributions(db, [employee_number])
+    )
     
     db.commit()
+    bump_data_version()
     
     return {"message": "Evaluation submitted successfully"}
 
@@ -166,6 +204,189 @@ def submit_evaluation(
 
 
 
+# Employees resolved and updated per round of keyed queries in a batch
+EVALUATION_LOOKUP_CHUNK_SIZE = int(os.getenv("EVALUATION_LOOKUP_CHUNK_SIZE", "500"))
+
+
+def _apply_evaluations(
+    db: Session,
+    evaluations: Dict[str, Dict[str, int]],
+    evaluator_id: str,
+    cycle: Optional[str] = None
+) -> List[dict]:
+    """
+    Apply `evaluations` ({employee number: {competency code: score}}) with
+    one keyed SELECT, one bulk UPDATE of scores, one UPDATE of the
+    employees' evaluation status and one bulk INSERT into the evaluation
+    history. Does not commit.
+    """
+    employee_numbers = list(evaluations)
+    summary_before = gap_summary.employee_contributions(db, employee_numbers)
+
+    pairs = [(number, code) for number in summary_before for code in evaluations[number]]
+    targets = db.execute(
+        select(
+            EmployeeCompetency.id,
+            EmployeeCompetency.employee_number,
+            EmployeeCompetency.competency_code,
+            EmployeeCompetency.required_score
+        )
+        .where(tuple_(EmployeeCompetency.employee_number, EmployeeCompetency.competency_code).in_(pairs))
+    ).all() if pairs else []
+
+    score_updates = [
+        {"id": row.id, "actual_score": evaluations[row.employee_number][row.competency_code]}
+        for row in targets
+    ]
+    if score_updates:
+        db.execute(update(EmployeeCompetency), score_updates)
+        evaluation_history.record_evaluations(db, [
+            {
+                "employee_number": row.employee_number,
+                "department_code": summary_before[row.employee_number]["department_code"],
+                "competency_code": row.competency_code,
+                "required_score": row.required_score,
+                "actual_score": evaluations[row.employee_number][row.competency_code]
+            }
+            for row in targets
+        ], evaluator_id, cycle=cycle)
+
+    if summary_before:
+        db.execute(
+            update(Employee)
+            .where(Employee.employee_number.in_(list(summary_before)))
+            .values(
+                evaluation_status=True,
+                evaluation_by=evaluator_id,
+                last_evaluated_date=datetime.utcnow().date()
+            )
+        )
+        gap_summary.apply_changes(
+            db, summary_before, gap_summary.employee_contributions(db, list(summary_before))
+        )
+
+    matched: Dict[str, set] = {}
+    for row in targets:
+        matched.setdefault(row.employee_number, set()).add(row.competency_code)
+
+    results = []
+    for number in employee_numbers:
+        if number not in summary_before:
+            results.append({"employee_number": number, "status": "error", "message": "Employee not found"})
+            continue
+        found = matched.get(number, set())
+        results.append({
+            "employee_number": number,
+            "status": "success",
+            "updated_scores": len(found),
+            # Codes the employee has no competency row for are skipped, as in /evaluations
+            "unmatched_codes": sorted(code for code in evaluations[number] if code not in found)
+        })
+    return results
+
+
+@router.post("/evaluations/batch")
+def submit_evaluation_batch(
+    batch: schemas.BatchEvaluationRequest,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Submit scores for many employees at once. The whole batch is one
+    transaction unless `chunk_size` is given, in which case every
+    `chunk_size` employees are committed separately and a failing chunk
+    only fails its own employees. Later entries for the same employee
+    and competency win.
+    """
+    evaluator_id = current_user["username"]
+
+    evaluations: Dict[str, Dict[str, int]] = {}
+    for evaluation in batch.evaluations:
+        scores = evaluations.setdefault(evaluation.employee_number, {})
+        for score in evaluation.scores:
+            scores[score.competency_code] = score.actual_score
+
+    employee_numbers = list(evaluations)
+    transaction_size = batch.chunk_size or max(len(employee_numbers), 1)
+    results = []
+
+    for start in range(0, len(employee_numbers), transaction_size):
+        transaction_numbers = employee_numbers[start:start + transaction_size]
+        try:
+            transaction_results = []
+            for offset in range(0, len(transaction_numbers), EVALUATION_LOOKUP_CHUNK_SIZE):
+                chunk = transaction_numbers[offset:offset + EVALUATION_LOOKUP_CHUNK_SIZE]
+                transaction_results.extend(
+                    _apply_evaluations(
+                        db, {number: evaluations[number] for number in chunk}, evaluator_id, batch.cycle
+                    )
+                )
+            db.commit()
+            bump_data_version()
+            results.extend(transaction_results)
+        except Exception as e:
+            db.rollback()
+            if batch.chunk_size is None:
+                raise HTTPException(status_code=500, detail=f"Error submitting evaluations: {str(e)}")
+            results.extend(
+                {"employee_number": number, "status": "error", "message": str(e)}
+                for number in transaction_numbers
+            )
+
+    return {
+        "message": "Evaluations processed",
+        "results": results,
+        "total_processed": len(results),
+        "success_count": len([r for r in results if r["status"] == "success"]),
+        "error_count": len([r for r in results if r["status"] == "error"]),
+        "updated_scores": sum(r.get("updated_scores", 0) for r in results)
+    }
+
+
+@router.get("/evaluations/history/{employee_number}")
+def get_evaluation_history(
+    employee_number: str,
+    competency_code: Optional[str] = None,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Every score submitted for an employee, oldest first; HODs see evaluations made in their department."""
+    department_code = None
+    if current_user["role"] != "HR":
+        department_code = current_user["department_code"]
+
+    return evaluation_history.employee_history(
+        db, employee_number, competency_code, department_code, from_date, to_date
+    )
+
+
+@router.get("/evaluations/as-of")
+def get_scores_as_of(
+    as_of: date,
+    employee_number: Optional[str] = None,
+    department_code: Optional[str] = None,
+    competency_code: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    The latest score of each employee competency on `as_of` (inclusive),
+    as recorded in the evaluation history. HODs are limited to their own
+    department.
+    """
+    if current_user["role"] != "HR":
+        department_code = current_user["department_code"]
+    if employee_number is None and department_code is None and competency_code is None:
+        raise HTTPException(
+            status_code=400,
+            detail="Filter by employee_number, department_code or competency_code"
+        )
+
+    return evaluation_history.scores_as_of(db, as_of, employee_number, department_code, competency_code)
+
+
 @router.get("/employee-competencies", response_model=List[EmployeeCompetencyResponse])
 def get_all_employee_competencies(
     db: Session = Depends(get_db)
@@ -3,6 +3,8 @@ from sqlalchemy.orm import Session
 from models import Department
 from schemas import DepartmentCreate, DepartmentResponse
 from database import get_db
+from cache import bump_data_version
+import refdata
 
 router = APIRouter()
 
@@ -15,6 +17,8 @@ def create_department(department: DepartmentCreate, db: Session = Depends(get_db
     new_department = Department(department_code = department.department_code,name=department.name)
     db.add(new_department)
     db.commit()
+    refdata.refresh(db)
+    bump_data_version()
     db.refresh(new_department)
 
     return new_department
@@ -32,6 +36,8 @@ def update_department(department_code: str, department_data: DepartmentCreate, d
     department.department_code = department_data.department_code
     department.name = department_data.name
     db.commit()
+    refdata.refresh(db)
+    bump_data_version()
     db.refresh(department)
 
     return department
@@ -44,5 +50,7 @@ def delete_department(department_code: str, db: Session = Depends(get_db)):
 
     db.delete(department)
     db.commit()
+    refdata.refresh(db)
+    bump_data_version()
 
     return {"message": "Department deleted successfully"}
@@ -1,23 +1,30 @@
 from datetime import date
 from typing import List
-from fastapi import APIRouter, Depends, File, UploadFile
+from fastapi import APIRouter, Depends, File, Query, Response, UploadFile
 from pydantic import BaseModel
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from auth import get_current_user
-from database import get_db
-from models import Competency, Department, Employee, EmployeeCompetency, RoleCompetency
-from fastapi.responses import JSONResponse
-import pandas as pd
-import re
+from database import SessionLocal, get_async_db, get_db
+from models import Employee, EmployeeCompetency, EvaluationHistory, RoleCompetency
 import json
-from io import BytesIO
-from typing import List
+import logging
+import os
+from itertools import islice
+from typing import Callable, Dict, Iterable, List, Literal, Optional
 from sqlalchemy.orm import Session
 from models import Employee, EmployeeCompetency, RoleCompetency
 from database import get_db
 from auth import get_current_user
-from schemas import BulkEvaluationStatusUpdate, EmployeeCreateRequest, EmployeeEvaluationStatusUpdate, EmployeeResponse
+from schemas import BulkEvaluationStatusUpdate, EmployeeCreateRequest, EmployeeEvaluationStatusUpdate, EmployeeResponse, EmployeeUpdateResponse
+from excel_parser import iter_excel_employees
+from pagination import decode_cursor, encode_cursor
+import gap_summary
+from jobs import JobQueue, QueueFullError
+from cache import bump_data_version
+import refdata
 
 
 
@@ -26,6 +33,39 @@ from schemas import BulkEvaluationStatusUpdate, EmployeeCreateRequest, EmployeeE
 router = APIRouter()
 from fastapi import HTTPException, status
 
+logger = logging.getLogger("employee")
+
+
+def _role_competency_scores(db: Session, role_code: str) -> Dict[str, int]:
+    """
+    The role's competencies and required scores (the first assignment wins
+    for a code listed twice), read in the caller's transaction rather than
+    from the reference-data cache, which another worker may have made stale.
+    """
+    scores: Dict[str, int] = {}
+    for rc in db.query(RoleCompetency.competency_code, RoleCompetency.required_score).filter(
+        RoleCompetency.role_code == role_code
+    ).order_by(RoleCompetency.id).all():
+        scores.setdefault(rc.competency_code, rc.required_score)
+    return scores
+
+
+def _validate_references(employee_data: EmployeeCreateRequest) -> None:
+    """Reject unknown department or role codes, checked against the reference-data cache."""
+    references = refdata.covering(
+        departments=[employee_data.department_code], roles=[employee_data.role_code]
+    )
+    if references.department(employee_data.department_code) is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Department '{employee_data.department_code}' not found"
+        )
+    if references.role(employee_data.role_code) is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Role '{employee_data.role_code}' not found"
+        )
+
 @router.post("/employees", response_model=EmployeeResponse)
 def create_employee(
     employee_data: EmployeeCreateRequest, 
@@ -42,6 +82,8 @@ def create_employee(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Employee with number {employee_data.employee_number} already exists"
         )
+
+    _validate_references(employee_data)
     
     try:
         # Create employee
@@ -49,22 +91,25 @@ def create_employee(
         db.add(db_employee)
         db.flush()  # Ensure we get the employee_number
         
-        # Get competencies for the role
-        role_competencies = db.query(RoleCompetency).filter(
-            RoleCompetency.role_code == employee_data.role_code
-        ).all()
-        
-        # Create employee competencies
-        for rc in role_competencies:
+        # Create employee competencies for the role's competencies
+        for competency_code, required_score in _role_competency_scores(db, employee_data.role_code).items():
             db_competency = EmployeeCompetency(
                 employee_number=db_employee.employee_number,
-                competency_code=rc.competency_code,
-                required_score=rc.required_score,
+                competency_code=competency_code,
+                required_score=required_score,
                 actual_score=None  # Changed to None as per your original requirement
             )
             db.add(db_competency)
+
+        # New competencies have no actual score yet, so only the counts move
+        gap_summary.apply_changes(db, {}, {
+            db_employee.employee_number: gap_summary.contribution_from_rows(
+                employee_data.department_code, False, []
+            )
+        })
         
         db.commit()
+        bump_data_version()
         db.refresh(db_employee)
         return db_employee
         
@@ -79,13 +124,93 @@ def create_employee(
 
 
 
-@router.put("/employees/{employee_number}", response_model=EmployeeResponse)
+def _reconcile_competencies(db: Session, employee_number: str, role_code: str) -> dict:
+    """
+    Make the employee's competency rows match the role's: add missing
+    competencies (without a score), delete ones the role does not list and
+    correct required scores that differ. Rows present on both sides keep
+    their actual score. Returns the number of rows inserted, deleted and
+    updated. Does not commit.
+    """
+    current = {
+        row.competency_code: row for row in db.query(
+            EmployeeCompetency.id, EmployeeCompetency.competency_code, EmployeeCompetency.required_score
+        ).filter(EmployeeCompetency.employee_number == employee_number).all()
+    }
+    target = _role_competency_scores(db, role_code)
+
+    stale_ids = [row.id for code, row in current.items() if code not in target]
+    if stale_ids:
+        db.query(EmployeeCompetency).filter(
+            EmployeeCompetency.id.in_(stale_ids)
+        ).delete(synchronize_session=False)
+
+    missing = [
+        {
+            "employee_number": employee_number,
+            "competency_code": code,
+            "required_score": required_score,
+            "actual_score": None
+        }
+        for code, required_score in target.items() if code not in current
+    ]
+    if missing:
+        db.bulk_insert_mappings(EmployeeCompetency, missing)
+
+    changed = [
+        {"id": row.id, "required_score": target[code]}
+        for code, row in current.items() if code in target and row.required_score != target[code]
+    ]
+    if changed:
+        db.bulk_update_mappings(EmployeeCompetency, changed)
+
+    return {"inserted": len(missing), "deleted": len(stale_ids), "updated": len(changed)}
+
+
+def _renumber_employee(db: Session, db_employee: Employee, employee_data: EmployeeCreateRequest):
+    """
+    Move an employee to a new employee number. The primary key is never
+    updated in place: the new row is inserted, the rows referencing the
+    employee are moved to it, and then the old row is deleted, so foreign
+    keys hold after every statement. The evaluation history is re-pointed
+    too. Returns the new row and the number
+    of competency rows moved. Does not commit.
+    """
+    old_number = db_employee.employee_number
+    new_employee = Employee(
+        **employee_data.dict(),
+        evaluation_status=db_employee.evaluation_status,
+        evaluation_by=db_employee.evaluation_by,
+        last_evaluated_date=db_employee.last_evaluated_date
+    )
+    db.add(new_employee)
+    db.flush()
+
+    moved = db.query(EmployeeCompetency).filter(
+        EmployeeCompetency.employee_number == old_number
+    ).update({"employee_number": new_employee.employee_number}, synchronize_session=False)
+    # The evaluation history follows the employee to the new number
+    db.query(EvaluationHistory).filter(
+        EvaluationHistory.employee_number == old_number
+    ).update({"employee_number": new_employee.employee_number}, synchronize_session=False)
+
+    db.delete(db_employee)
+    db.flush()
+    return new_employee, moved
+
+
+@router.put("/employees/{employee_number}", response_model=EmployeeUpdateResponse)
 def update_employee(
     employee_number: str,
     employee_data: EmployeeCreateRequest,
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
+    """
+    Update an employee. Competency rows are only touched when the role
+    changes, and then only for the competencies that differ between the
+    old and new role; `competency_changes` reports the rows written.
+    """
     try:
         # Check if employee exists
         db_employee = db.query(Employee).filter(
@@ -109,35 +234,44 @@ def update_employee(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail=f"Employee with number {employee_data.employee_number} already exists"
                 )
+
+        _validate_references(employee_data)
         
-        # First delete all existing employee competencies
-        db.query(EmployeeCompetency).filter(
-            EmployeeCompetency.employee_number == employee_number
-        ).delete()
-        
-        # Update employee data
-        for field, value in employee_data.dict().items():
-            setattr(db_employee, field, value)
-        
-        # Get competencies for the new role
-        role_competencies = db.query(RoleCompetency).filter(
-            RoleCompetency.role_code == employee_data.role_code
-        ).all()
-        
-        # Create new employee competencies
-        for rc in role_competencies:
-            db_competency = EmployeeCompetency(
-                employee_number=employee_data.employee_number,
-                competency_code=rc.competency_code,
-                required_score=rc.required_score,
-                actual_score=None
-            )
-            db.add(db_competency)
+        summary_before = gap_summary.employee_contributions(db, [employee_number])
+        role_changed = db_employee.role_code != employee_data.role_code
+        changes = {"inserted": 0, "deleted": 0, "updated": 0}
+
+        if employee_number != employee_data.employee_number:
+            db_employee, moved = _renumber_employee(db, db_employee, employee_data)
+            changes["updated"] += moved
+        else:
+            # Update employee data
+            for field, value in employee_data.dict().items():
+                setattr(db_employee, field, value)
+            db.flush()
+
+        if role_changed:
+            reconciled = _reconcile_competencies(db, employee_data.employee_number, employee_data.role_code)
+            for key, count in reconciled.items():
+                changes[key] += count
+
+        db.flush()
+        gap_summary.apply_changes(
+            db,
+            summary_before,
+            gap_summary.employee_contributions(db, [employee_data.employee_number])
+        )
         
         db.commit()
+        bump_data_version()
         db.refresh(db_employee)
-        return db_employee
+        return {
+            **EmployeeResponse.model_validate(db_employee).model_dump(),
+            "competency_changes": changes
+        }
         
+    except HTTPException:
+        raise
     except Exception as e:
         db.rollback()
         raise HTTPException(
@@ -163,6 +297,10 @@ def delete_employee(
                 detail=f"Employee with number {employee_number} not found"
             )
         
+        gap_summary.apply_changes(
+            db, gap_summary.employee_contributions(db, [employee_number]), {}
+        )
+
         # First delete all employee competencies
         db.query(EmployeeCompetency).filter(
             EmployeeCompetency.employee_number == employee_number
@@ -171,6 +309,7 @@ def delete_employee(
         # Then delete the employee
         db.delete(db_employee)
         db.commit()
+        bump_data_version()
         
         return {"message": f"Employee {employee_number} deleted successfully"}
         
@@ -182,26 +321,121 @@ def delete_employee(
         )
 
 
+# Sortable columns for GET /employees; each is paired with employee_number
+# as a tie-breaker so (sort value, employee_number) is a unique keyset.
+EMPLOYEE_SORT_COLUMNS = {
+    "employee_number": Employee.employee_number,
+    "employee_name": Employee.employee_name,
+}
+
+
+def _after_cursor(column, value, employee_number: str, descending: bool):
+    """
+    Rows strictly after (value, employee_number) in the listing order.
+    NULL sort values come first ascending and last descending.
+    """
+    pk = Employee.employee_number
+    if column is pk:
+        return pk < employee_number if descending else pk > employee_number
+
+    if not descending:
+        if value is None:
+            return or_(and_(column.is_(None), pk > employee_number), column.isnot(None))
+        return or_(column > value, and_(column == value, pk > employee_number))
+
+    if value is None:
+        return and_(column.is_(None), pk < employee_number)
+    return or_(column < value, and_(column == value, pk < employee_number), column.is_(None))
+
+
+# Page size when a cursor is passed without a limit
+EMPLOYEE_PAGE_SIZE = 100
+
+
 @router.get("/employees", response_model=List[EmployeeResponse])
-def get_all_employees(
-    db: Session = Depends(get_db),
+async def get_all_employees(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    sort: Literal["employee_number", "employee_name"] = "employee_number",
+    order: Literal["asc", "desc"] = "asc",
+    role_code: Optional[str] = None,
+    department_code: Optional[str] = None,
+    evaluation_status: Optional[bool] = None,
+    evaluated_from: Optional[date] = None,
+    evaluated_to: Optional[date] = None,
+    name_prefix: Optional[str] = None,
+    include_total: bool = True,
+    db: AsyncSession = Depends(get_async_db),
     current_user: dict = Depends(get_current_user)
 ):
-    
+    """
+    Employees in keyset order. Without `limit` and `cursor` every matching
+    employee is returned, as before pagination existed. With `limit` (or a
+    `cursor`, which defaults the page to EMPLOYEE_PAGE_SIZE rows) one page
+    is returned; pass the X-Next-Cursor response header back as `cursor`
+    to get the following page, it is absent on the last page.
+    X-Total-Count holds the number of matching employees unless
+    include_total=false. HODs only ever see their own department.
+    """
     try:
-        if(current_user["role"]=="HR"):
-
-            employees = db.query(Employee).all()
-           
-            return employees
+        if current_user["role"] != "HR":
+            department_code = current_user["department_code"]
+
+        filters = []
+        if role_code is not None:
+            filters.append(Employee.role_code == role_code)
+        if department_code is not None:
+            filters.append(Employee.department_code == department_code)
+        if evaluation_status is not None:
+            filters.append(Employee.evaluation_status == evaluation_status)
+        if evaluated_from is not None:
+            filters.append(Employee.last_evaluated_date >= evaluated_from)
+        if evaluated_to is not None:
+            filters.append(Employee.last_evaluated_date <= evaluated_to)
+        if name_prefix:
+            # A range rather than LIKE so the name index can be used
+            filters.append(Employee.employee_name >= name_prefix)
+            filters.append(Employee.employee_name < name_prefix + "\U0010ffff")
+
+        column = EMPLOYEE_SORT_COLUMNS[sort]
+        descending = order == "desc"
+
+        query = select(Employee).where(*filters)
+        if cursor is not None:
+            value, employee_number = decode_cursor(cursor, 2)
+            query = query.where(_after_cursor(column, value, employee_number, descending))
+
+        if column is Employee.employee_number:
+            ordering = [column.desc() if descending else column.asc()]
+        elif descending:
+            ordering = [column.desc().nulls_last(), Employee.employee_number.desc()]
         else:
-            print()
-            employees = db.query(Employee).filter(
-            Employee.department_code == current_user["department_code"]
-        ).all()
-            
-            return employees
+            ordering = [column.asc().nulls_first(), Employee.employee_number.asc()]
+
+        query = query.order_by(*ordering)
+        if limit is None and cursor is not None:
+            limit = EMPLOYEE_PAGE_SIZE
+        if limit is not None:
+            # One extra row tells whether another page follows
+            query = query.limit(limit + 1)
+
+        employees = (await db.execute(query)).scalars().all()
+        if limit is not None and len(employees) > limit:
+            employees = employees[:limit]
+            last = employees[-1]
+            response.headers["X-Next-Cursor"] = encode_cursor(
+                [getattr(last, sort), last.employee_number]
+            )
+
+        if include_total:
+            total = await db.scalar(select(func.count()).select_from(Employee).where(*filters))
+            response.headers["X-Total-Count"] = str(total)
 
+        return employees
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -311,132 +545,6 @@ def get_all_employees(
 #         employees.append(current_employee)
     
 #     return employees
-def process_excel_content(excel_content: bytes) -> List[dict]:
-    xls = pd.ExcelFile(BytesIO(excel_content))
-    csv_content = []
-    
-    for sheet_name in xls.sheet_names:
-        csv_content.append(f"--- Sheet: {sheet_name} ---,\n")
-        df = pd.read_excel(xls, sheet_name=sheet_name, header=None)
-        
-        for row in df.values:
-            clean_row = [str(cell).strip().replace(',', '/') if pd.notna(cell) else "" for cell in row]
-            
-            cleaned = []
-            prev_empty = False
-            for cell in clean_row:
-                if cell == "":
-                    if not prev_empty:
-                        cleaned.append(cell)
-                    prev_empty = True
-                else:
-                    cleaned.append(cell)
-                    prev_empty = False
-            
-            csv_line = ",".join([cell for cell in cleaned if cell != ""]) + ","
-            csv_line = re.sub(r',,+', ',', csv_line)
-            
-            if csv_line.strip(','):
-                csv_content.append(csv_line + "\n")
-        
-        csv_content.append(",\n")
-    
-    employees = []
-    current_employee = None
-    current_sheet = ""
-    words = []
-    in_competencies = False
-    rpl_apl_count = 0
-    
-    for line in csv_content:
-        line = line.strip()
-        if not line:
-            continue
-        
-        raw_parts = line.split(',')
-        line_words = []
-        
-        for part in raw_parts:
-            stripped_word = part.strip()
-            if stripped_word:
-                line_words.append(stripped_word)
-        
-        words.extend(line_words)
-
-    i = 0
-    while i < len(words):
-        word = words[i]
-        
-        if word.startswith('--- Sheet:'):
-            if current_employee is not None:
-                employees.append(current_employee)
-            current_employee = {
-                "EmployeeNumber": "",
-                "EmployeeName": "",
-                "JobCode": "",
-                "ReportingEmployeeName": "",
-                "RoleCode": "",
-                "Department": "",
-                "Competencies": []
-            }
-            in_competencies = False
-            rpl_apl_count = 0
-            current_sheet = word.replace('--- Sheet:', '').replace('---', '').strip()
-            i += 1
-            continue
-        
-        if not in_competencies:
-            if word == "Employee Number" and i+1 < len(words):
-                current_employee["EmployeeNumber"] = words[i+1]
-                i += 2
-            elif word == "Employee Name" and i+1 < len(words):
-                current_employee["EmployeeName"] = words[i+1]
-                i += 2
-            elif word == "Job Code" and i+1 < len(words):
-                current_employee["JobCode"] = words[i+1]
-                i += 2
-            elif word == "Reporting Employee Name" and i+1 < len(words):
-                current_employee["ReportingEmployeeName"] = words[i+1]
-                i += 2
-            elif word == "Role Code" and i+1 < len(words):
-                current_employee["RoleCode"] = words[i+1]
-                i += 2
-            elif word == "Department & Cost Centre" and i+1 < len(words):
-                current_employee["Department"] = words[i+1]
-                i += 2
-            elif word == "RPL/APL":
-                rpl_apl_count += 1
-                if rpl_apl_count == 2:  # Second occurrence starts competencies
-                    in_competencies = True
-                i += 1
-            else:
-                i += 1
-        else:
-            # Competency parsing logic
-            if i + 2 < len(words):
-                # Skip headers
-                if words[i] in ["Functional competencies", "Behavioral competencies"]:
-                    i += 1
-                    continue
-                
-                # Get score part before slash and convert to integer
-                raw_score = words[i+2]
-                score = int(raw_score.split('/')[0]) if raw_score else 0
-                
-                current_employee["Competencies"].append({
-                    "Code": words[i+1],
-                    "Score": score
-                })
-                i += 3
-            else:
-                i += 1
-    
-    if current_employee is not None:
-        employees.append(current_employee)
-    
-    return employees
-
-
 # @router.post("/employees/upload-excel")
 # async def upload_excel_employees(
 #     file: UploadFile = File(...),
@@ -521,103 +629,267 @@ def process_excel_content(excel_content: bytes) -> List[dict]:
 #         )
     
 
-@router.post("/employees/upload-excel")
-async def upload_excel_employees(
-    file: UploadFile = File(...),
-    db: Session = Depends(get_db),
-):
+# Employees written per transaction by the Excel ingest
+UPLOAD_CHUNK_SIZE = 500
+# Upper bound on the number of values bound into a single IN (...) lookup
+LOOKUP_CHUNK_SIZE = 500
+
+
+def _chunks(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _existing_values(db: Session, column, values) -> set:
+    """Subset of `values` present in `column`, looked up with chunked IN queries."""
+    found = set()
+    for chunk in _chunks(list(set(values)), LOOKUP_CHUNK_SIZE):
+        found.update(row[0] for row in db.query(column).filter(column.in_(chunk)).all())
+    return found
+
+
+def ingest_employees(
+    db: Session,
+    employee_data: Iterable[dict],
+    on_batch: Optional[Callable[[List[dict]], None]] = None
+) -> List[dict]:
+    """
+    Insert parsed workbook employees set-wise and return one result entry
+    per employee, in input order.
+
+    Employees are consumed in batches of UPLOAD_CHUNK_SIZE, so a streamed
+    workbook is never fully held in memory. For each batch, the referenced
+    employee numbers, department codes and competency codes are resolved
+    with a few IN queries, rows are validated in memory, and the valid ones
+    are written with bulk inserts in a single transaction. If a batch fails
+    to commit, its employees are retried one per transaction, so only the
+    rows that actually fail are reported with the database error. Sheets
+    the parser could not read are reported as errors and skipped.
+    `on_batch`, if given, is called with each batch's results once the
+    batch has been written.
+    """
+    results: List[dict] = []
+    seen = set()
+    employees = iter(employee_data)
+
+    while True:
+        batch = list(islice(employees, UPLOAD_CHUNK_SIZE))
+        if not batch:
+            return results
+        batch_results = _ingest_batch(db, batch, seen)
+        results.extend(batch_results)
+        if on_batch is not None:
+            on_batch(batch_results)
+
+
+def _write_employees(db: Session, pending: List[tuple]) -> None:
+    """Insert (index, employee, competency rows) entries and their summary contributions, and commit."""
+    db.bulk_insert_mappings(Employee, [employee for _, employee, _ in pending])
+    db.bulk_insert_mappings(
+        EmployeeCompetency, [row for _, _, rows in pending for row in rows]
+    )
+    gap_summary.apply_changes(db, {}, {
+        employee["employee_number"]: gap_summary.contribution_from_rows(
+            employee["department_code"],
+            False,
+            [(row["competency_code"], row["required_score"], row["actual_score"]) for row in rows]
+        )
+        for _, employee, rows in pending
+    })
+    db.commit()
+
+
+def _ingest_batch(db: Session, employee_data: List[dict], seen: set) -> List[dict]:
+    parsed = [emp for emp in employee_data if "ParseError" not in emp]
+    existing_employees = _existing_values(
+        db, Employee.employee_number, [emp["EmployeeNumber"] for emp in parsed]
+    )
+    references = refdata.covering(
+        departments={emp["Department"] for emp in parsed},
+        competencies={comp["Code"] for emp in parsed for comp in emp.get("Competencies", [])}
+    )
+    departments = references.departments
+    competencies = references.competencies
+
+    results: List[dict] = [None] * len(employee_data)
+    pending = []
+    batch_seen = set()
+    # Unknown competency codes skipped per row, reported with its result
+    skipped: Dict[int, List[str]] = {}
+
+    for index, emp in enumerate(employee_data):
+        employee_number = emp["EmployeeNumber"]
+        try:
+            if "ParseError" in emp:
+                results[index] = {
+                    "employee_number": employee_number or "UNKNOWN",
+                    "status": "error",
+                    "message": emp["ParseError"]
+                }
+                continue
+
+            if (
+                employee_number in existing_employees
+                or employee_number in seen
+                or employee_number in batch_seen
+            ):
+                results[index] = {
+                    "employee_number": employee_number,
+                    "status": "error",
+                    "message": "Employee already exists"
+                }
+                continue
+
+            if emp["Department"] not in departments:
+                results[index] = {
+                    "employee_number": employee_number,
+                    "status": "error",
+                    "message": f"Department '{emp['Department']}' not found"
+                }
+                continue
+
+            # One row per competency (the table is unique on employee and
+            # competency); a code listed twice keeps its last score
+            competency_rows = {}
+            for comp in emp.get("Competencies", []):
+                if comp["Code"] in competencies:
+                    competency_rows[comp["Code"]] = {
+                        "employee_number": employee_number,
+                        "competency_code": comp["Code"],
+                        "required_score": int(comp["Score"]),
+                        "actual_score": 0
+                    }
+                else:
+                    skipped.setdefault(index, []).append(comp["Code"])
+                    logger.warning("Competency %s not found for employee %s", comp["Code"], employee_number)
+
+            batch_seen.add(employee_number)
+            pending.append((index, {
+                "employee_number": employee_number,
+                "employee_name": emp["EmployeeName"],
+                "job_code": emp["JobCode"],
+                "reporting_employee_name": emp["ReportingEmployeeName"],
+                "role_code": emp["RoleCode"],
+                "department_code": emp["Department"],
+                "evaluation_status": False,
+                "evaluation_by": None,
+                "last_evaluated_date": None
+            }, list(competency_rows.values())))
+
+        except Exception as e:
+            results[index] = {
+                "employee_number": emp.get("EmployeeNumber", "UNKNOWN"),
+                "status": "error",
+                "message": str(e)
+            }
+
+    if not pending:
+        return results
+
     try:
-        excel_content = await file.read()
-        employee_data = process_excel_content(excel_content)
-        
-        results = []
-        
-        for emp in employee_data:
+        _write_employees(db, pending)
+        written = pending
+    except Exception:
+        db.rollback()
+        # Retry one employee per transaction to find the rows that fail
+        written = []
+        for entry in pending:
             try:
-                # Check if employee exists
-                if db.query(Employee).filter_by(employee_number=emp["EmployeeNumber"]).first():
-                    results.append({
-                        "employee_number": emp["EmployeeNumber"],
-                        "status": "error",
-                        "message": "Employee already exists"
-                    })
-                    continue
-                
-                # Verify department exists
-                department = db.query(Department).filter(
-                    (
-                        Department.department_code == emp["Department"]
-                    )
-                ).first()
-                
-                if not department:
-                    results.append({
-                        "employee_number": emp["EmployeeNumber"],
-                        "status": "error",
-                        "message": f"Department '{emp['Department']}' not found"
-                    })
-                    continue
-                
-                # Create new employee
-                new_employee = Employee(
-                    employee_number=emp["EmployeeNumber"],
-                    employee_name=emp["EmployeeName"],
-                    job_code=emp["JobCode"],
-                    reporting_employee_name=emp["ReportingEmployeeName"],
-                    role_code=emp["RoleCode"],
-                    department_code=department.department_code,
-                    evaluation_status=False,
-                    evaluation_by=None,
-                    last_evaluated_date=None
-                )
-                db.add(new_employee)
-                db.flush()
-                
-                if "Competencies" in emp:
-                    for comp in emp["Competencies"]:
-                        competency = db.query(Competency).filter_by(
-                            code=comp["Code"]
-                        ).first()
-                        
-                        if competency:
-                            score = int(comp["Score"])
-                            db.add(EmployeeCompetency(
-                                employee_number=new_employee.employee_number,
-                                competency_code=comp["Code"],
-                                required_score=score,  
-                                actual_score=0  
-                            ))
-                        else:
-                            print(f"Competency {comp['Code']} not found for employee {emp['EmployeeNumber']}")
-                
-                db.commit()
-                
-                results.append({
-                    "employee_number": emp["EmployeeNumber"],
-                    "status": "success",
-                    "message": "Employee created successfully"
-                })
-                
+                _write_employees(db, [entry])
+                written.append(entry)
             except Exception as e:
                 db.rollback()
-                results.append({
-                    "employee_number": emp.get("EmployeeNumber", "UNKNOWN"),
+                index, employee, _ = entry
+                results[index] = {
+                    "employee_number": employee["employee_number"],
                     "status": "error",
                     "message": str(e)
-                })
-        
-        return JSONResponse(content={
-            "results": results,
-            "total_processed": len(employee_data),
-            "success_count": len([r for r in results if r["status"] == "success"]),
-            "error_count": len([r for r in results if r["status"] == "error"])
-        })
-    
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Error processing file: {str(e)}"
-        )
+                }
+
+    if written:
+        bump_data_version()
+    for index, employee, _ in written:
+        seen.add(employee["employee_number"])
+        results[index] = {
+            "employee_number": employee["employee_number"],
+            "status": "success",
+            "message": "Employee created successfully"
+        }
+        if index in skipped:
+            results[index]["message"] += f"; unknown competencies skipped: {', '.join(skipped[index])}"
+            results[index]["warnings"] = [f"Competency '{code}' not found" for code in skipped[index]]
+
+    return results
+
+
+# Workbook uploads run on this queue so parsing and the database writes
+# never block the event loop
+upload_jobs = JobQueue(
+    "upload",
+    max_workers=int(os.getenv("UPLOAD_JOB_WORKERS", "2")),
+    max_pending=int(os.getenv("UPLOAD_JOB_MAX_PENDING", "16")),
+)
+
+# Processes used to parse large workbooks (1 parses in the job thread)
+EXCEL_PARSE_WORKERS = int(os.getenv("EXCEL_PARSE_WORKERS", "1"))
+
+
+def _upload_report(results: List[dict]) -> dict:
+    return {
+        "results": results,
+        "total_processed": len(results),
+        "success_count": len([r for r in results if r["status"] == "success"]),
+        "error_count": len([r for r in results if r["status"] == "error"]),
+        "warning_count": len([r for r in results if r.get("warnings")])
+    }
+
+
+def _run_upload_job(job, excel_content: bytes) -> dict:
+    def parsed_sheets():
+        for emp in iter_excel_employees(excel_content, workers=EXCEL_PARSE_WORKERS):
+            job.increment("sheets_parsed")
+            yield emp
+
+    def batch_written(batch_results: List[dict]) -> None:
+        success = len([r for r in batch_results if r["status"] == "success"])
+        job.increment("rows_committed", success)
+        job.increment("errors", len(batch_results) - success)
+
+    job.update(sheets_parsed=0, rows_committed=0, errors=0)
+    db = SessionLocal()
+    try:
+        return _upload_report(ingest_employees(db, parsed_sheets(), on_batch=batch_written))
+    finally:
+        db.close()
+
+
+@router.post("/employees/upload-excel", status_code=status.HTTP_202_ACCEPTED)
+async def upload_excel_employees(
+    file: UploadFile = File(...),
+):
+    """
+    Queue a workbook for import and return its job id immediately. Poll
+    /employees/upload-jobs/{job_id} for progress and the final results report.
+    """
+    excel_content = await file.read()
+    try:
+        job = upload_jobs.submit(_run_upload_job, excel_content)
+    except QueueFullError as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
+
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/employees/upload-jobs/{job.id}"
+    }
+
+
+@router.get("/employees/upload-jobs/{job_id}")
+def get_upload_job(job_id: str):
+    job = upload_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Upload job not found")
+    return job.to_dict()
 
 
 
@@ -638,6 +910,8 @@ async def update_employee_evaluation_status(
     db_employee = db.query(Employee).filter(Employee.employee_number == employee_number).first()
     if not db_employee:
         raise HTTPException(status_code=404, detail="Employee not found")
+
+    summary_before = gap_summary.employee_contributions(db, [employee_number])
     
     for key, value in update_data.dict().items():
         if value is not None:
@@ -645,8 +919,14 @@ async def update_employee_evaluation_status(
     
     if update_data.status:
         db_employee.last_evaluated_date = date.today()
+
+    db.flush()
+    gap_summary.apply_changes(
+        db, summary_before, gap_summary.employee_contributions(db, [employee_number])
+    )
     
     db.commit()
+    bump_data_version()
     db.refresh(db_employee)
     return db_employee
 
@@ -663,12 +943,21 @@ async def bulk_update_evaluation_status(
     
     if not employees:
         raise HTTPException(status_code=404, detail="No employees found")
+
+    employee_numbers = [employee.employee_number for employee in employees]
+    summary_before = gap_summary.employee_contributions(db, employee_numbers)
     
     for employee in employees:
         employee.evaluation_status = update_data.status
         if not update_data.status:
             employee.evaluation_by = None
             employee.last_evaluated_date = None
+
+    db.flush()
+    gap_summary.apply_changes(
+        db, summary_before, gap_summary.employee_contributions(db, employee_numbers)
+    )
     
     db.commit()
+    bump_data_version()
     return employees
\ No newline at end of file
@@ -0,0 +1,241 @@
+# evaluation_history.py
+#
+# Append-only evaluation history. Every submitted score is also written to
+# `evaluation_history` with its time, evaluator, the employee's department
+# and the review cycle, so scores can be read as of any date and gap trends
+# can be followed across cycles. `employee_competencies` keeps holding the
+# latest score for the live endpoints and summaries.
+import os
+from datetime import date, datetime, time, timedelta
+from typing import Iterable, List, Optional
+
+from sqlalchemy import case, func, insert, select
+from sqlalchemy.orm import Session
+
+from models import Employee, EmployeeCompetency, EvaluationHistory
+
+# Length of a review cycle in months: 6 gives "2026-H1", 3 "2026-Q3", 12 "2026"
+EVALUATION_CYCLE_MONTHS = int(os.getenv("EVALUATION_CYCLE_MONTHS", "6"))
+
+BACKFILL_BATCH_SIZE = 5000
+
+_CYCLE_PREFIXES = {6: "H", 3: "Q"}
+
+
+def cycle_for(moment: date) -> str:
+    """Review cycle label of a date, according to EVALUATION_CYCLE_MONTHS."""
+    if EVALUATION_CYCLE_MONTHS >= 12:
+        return str(moment.year)
+    index = (moment.month - 1) // EVALUATION_CYCLE_MONTHS + 1
+    return f"{moment.year}-{_CYCLE_PREFIXES.get(EVALUATION_CYCLE_MONTHS, 'P')}{index}"
+
+
+def record_evaluations(
+    db: Session,
+    rows: Iterable[dict],
+    evaluated_by: str,
+    evaluated_at: Optional[datetime] = None,
+    cycle: Optional[str] = None,
+) -> int:
+    """
+    Append history entries for submitted scores. Each row needs
+    employee_number, department_code, competency_code, required_score and
+    actual_score. Does not commit.
+    """
+    evaluated_at = evaluated_at or datetime.utcnow()
+    cycle = cycle or cycle_for(evaluated_at)
+    entries = [
+        {**row, "evaluated_at": evaluated_at, "evaluated_by": evaluated_by, "cycle": cycle}
+        for row in rows
+    ]
+    if entries:
+        db.execute(insert(EvaluationHistory.__table__), entries)
+    return len(entries)
+
+
+def _history_record(row) -> dict:
+    return {
+        "employeeNumber": row.employee_number,
+        "departmentCode": row.department_code,
+        "competencyCode": row.competency_code,
+        "requiredScore": row.required_score,
+        "actualScore": row.actual_score,
+        "evaluatedAt": row.evaluated_at.isoformat(),
+        "evaluatedBy": row.evaluated_by,
+        "cycle": row.cycle,
+    }
+
+
+def _time_range(from_date: Optional[date], to_date: Optional[date]) -> list:
+    """evaluated_at filters for an inclusive date range (served by the evaluated_at index)."""
+    filters = []
+    if from_date is not None:
+        filters.append(EvaluationHistory.evaluated_at >= datetime.combine(from_date, time.min))
+    if to_date is not None:
+        filters.append(EvaluationHistory.evaluated_at < datetime.combine(to_date + timedelta(days=1), time.min))
+    return filters
+
+
+def employee_history(
+    db: Session,
+    employee_number: str,
+    competency_code: Optional[str] = None,
+    department_code: Optional[str] = None,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+) -> List[dict]:
+    """An employee's evaluations, oldest first."""
+    query = db.query(EvaluationHistory).filter(
+        EvaluationHistory.employee_number == employee_number, *_time_range(from_date, to_date)
+    )
+    if competency_code is not None:
+        query = query.filter(EvaluationHistory.competency_code == competency_code)
+    if department_code is not None:
+        query = query.filter(EvaluationHistory.department_code == department_code)
+    rows = query.order_by(EvaluationHistory.evaluated_at, EvaluationHistory.id).all()
+    return [_history_record(row) for row in rows]
+
+
+def scores_as_of(
+    db: Session,
+    as_of: date,
+    employee_number: Optional[str] = None,
+    department_code: Optional[str] = None,
+    competency_code: Optional[str] = None,
+) -> List[dict]:
+    """
+    The latest evaluation of each employee competency made on or before
+    `as_of`: one ROW_NUMBER() pass over the entries up to that date.
+    """
+    filters = _time_range(None, as_of)
+    if employee_number is not None:
+        filters.append(EvaluationHistory.employee_number == employee_number)
+    if department_code is not None:
+        filters.append(EvaluationHistory.department_code == department_code)
+    if competency_code is not None:
+        filters.append(EvaluationHistory.competency_code == competency_code)
+
+    rank = func.row_number().over(
+        partition_by=(EvaluationHistory.employee_number, EvaluationHistory.competency_code),
+        order_by=(EvaluationHistory.evaluated_at.desc(), EvaluationHistory.id.desc()),
+    ).label("rank")
+    ranked = select(EvaluationHistory, rank).where(*filters).subquery()
+
+    rows = db.execute(
+        select(ranked).where(ranked.c.rank == 1).order_by(ranked.c.employee_number, ranked.c.competency_code)
+    ).all()
+    return [_history_record(row) for row in rows]
+
+
+def gap_trends(
+    db: Session,
+    by: str,
+    department_code: Optional[str] = None,
+    competency_code: Optional[str] = None,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+) -> List[dict]:
+    """
+    Gap evolution per review cycle and department (or competency). Within
+    a cycle only each employee competency's last evaluation counts. Gap
+    buckets match the dashboard; as in /analytics/gap-statistics, meanGap
+    is the plain mean of required - actual and meanShortfall counts scores
+    above the requirement as a zero gap.
+    """
+    filters = _time_range(from_date, to_date)
+    if department_code is not None:
+        filters.append(EvaluationHistory.department_code == department_code)
+    if competency_code is not None:
+        filters.append(EvaluationHistory.competency_code == competency_code)
+
+    rank = func.row_number().over(
+        partition_by=(EvaluationHistory.cycle, EvaluationHistory.employee_number, EvaluationHistory.competency_code),
+        order_by=(EvaluationHistory.evaluated_at.desc(), EvaluationHistory.id.desc()),
+    ).label("rank")
+    latest = select(
+        EvaluationHistory.cycle,
+        EvaluationHistory.department_code,
+        EvaluationHistory.competency_code,
+        EvaluationHistory.required_score,
+        EvaluationHistory.actual_score,
+        rank,
+    ).where(*filters).subquery()
+
+    group = latest.c.department_code if by == "department" else latest.c.competency_code
+    gap = latest.c.required_score - latest.c.actual_score
+    rows = db.execute(
+        select(
+            latest.c.cycle,
+            group.label("code"),
+            func.count().label("evaluations"),
+            func.sum(case((gap == 1, 1), else_=0)).label("gap1"),
+            func.sum(case((gap == 2, 1), else_=0)).label("gap2"),
+            func.sum(case((gap == 3, 1), else_=0)).label("gap3"),
+            func.avg(gap).label("mean_gap"),
+            func.avg(case((gap > 0, gap), else_=0)).label("mean_shortfall"),
+        )
+        .where(latest.c.rank == 1)
+        .group_by(latest.c.cycle, group)
+        .order_by(latest.c.cycle, group)
+    ).all()
+
+    return [
+        {
+            "cycle": row.cycle,
+            "code": row.code,
+            "evaluations": row.evaluations,
+            "gap1": int(row.gap1 or 0),
+            "gap2": int(row.gap2 or 0),
+            "gap3": int(row.gap3 or 0),
+            "meanGap": round(float(row.mean_gap), 4) if row.mean_gap is not None else None,
+            "meanShortfall": round(float(row.mean_shortfall), 4) if row.mean_shortfall is not None else None,
+        }
+        for row in rows
+    ]
+
+
+def ensure_backfilled(db: Session) -> None:
+    """
+    Seed an empty history with the scores of evaluated employees, dated at
+    the employee's last evaluation (or now, if unknown), so as-of queries
+    cover data entered before the history existed. Employees never
+    evaluated are skipped: their stored scores (e.g. the zeros a workbook
+    import writes) are not evaluations. Rows are streamed in batches of
+    BACKFILL_BATCH_SIZE.
+    """
+    if db.query(EvaluationHistory.id).first() is not None:
+        return
+
+    now = datetime.utcnow()
+    query = select(
+        EmployeeCompetency.employee_number,
+        Employee.department_code,
+        EmployeeCompetency.competency_code,
+        EmployeeCompetency.required_score,
+        EmployeeCompetency.actual_score,
+        Employee.last_evaluated_date,
+        Employee.evaluation_by,
+    ).join(
+        Employee, Employee.employee_number == EmployeeCompetency.employee_number
+    ).where(
+        Employee.evaluation_status.is_(True),
+        EmployeeCompetency.actual_score.isnot(None),
+    )
+
+    result = db.execute(query.execution_options(yield_per=BACKFILL_BATCH_SIZE))
+    for rows in result.partitions():
+        entries = []
+        for row in rows:
+            evaluated_at = datetime.combine(row.last_evaluated_date, time.min) if row.last_evaluated_date else now
+            entries.append({
+                "employee_number": row.employee_number,
+                "department_code": row.department_code,
+                "competency_code": row.competency_code,
+                "required_score": row.required_score,
+                "actual_score": row.actual_score,
+                "evaluated_at": evaluated_at,
+                "evaluated_by": row.evaluation_by,
+                "cycle": cycle_for(evaluated_at),
+            })
+        db.execute(insert(EvaluationHistory.__table__), entries)
+    db.commit()
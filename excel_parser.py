@@ -0,0 +1,214 @@
+# excel_parser.py
+#
+# Parser for the employee assessment workbooks uploaded through
+# /employees/upload-excel. Every worksheet describes one employee: a block of
+# "label, value" cells followed, after the second "RPL/APL" cell, by
+# "<no>, <competency code>, <score>/<max>" triples.
+import multiprocessing
+import posixpath
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Iterator, List, Optional
+from xml.etree import ElementTree
+
+import openpyxl
+
+# Header label -> key in the parsed employee dict
+HEADER_FIELDS = {
+    "Employee Number": "EmployeeNumber",
+    "Employee Name": "EmployeeName",
+    "Job Code": "JobCode",
+    "Reporting Employee Name": "ReportingEmployeeName",
+    "Role Code": "RoleCode",
+    "Department & Cost Centre": "Department",
+}
+
+# Section headings inside the competency block that are not part of a triple
+COMPETENCY_SECTION_HEADERS = ("Functional competencies", "Behavioral competencies")
+
+# Workbooks with fewer sheets than this are parsed in-process even when
+# workers are requested; starting the pool would cost more than it saves.
+PARALLEL_MIN_SHEETS = 200
+
+_SPREADSHEET_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_RELATIONSHIPS_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_OFFICE_DOCUMENT_REL = "http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"
+
+
+def _cell_word(value) -> str:
+    """Normalise a cell value to the word the parser sees ("" for empty cells)."""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip().replace(',', '/')
+
+
+def _sheet_words(worksheet) -> Iterator[str]:
+    """Non-empty cell words of a worksheet, row by row, left to right."""
+    for row in worksheet.iter_rows(values_only=True):
+        for value in row:
+            word = _cell_word(value)
+            if word:
+                yield word
+
+
+def parse_sheet(words: Iterator[str], sheet_name: Optional[str] = None) -> dict:
+    """
+    Run the employee/competency state machine over one sheet's words,
+    keeping at most three words of lookahead in memory. A sheet that cannot
+    be parsed is returned with a "ParseError" message (and whatever header
+    fields were read before the error) instead of raising, so one bad sheet
+    does not abort the rest of the workbook.
+    """
+    employee = {
+        "EmployeeNumber": "",
+        "EmployeeName": "",
+        "JobCode": "",
+        "ReportingEmployeeName": "",
+        "RoleCode": "",
+        "Department": "",
+        "Competencies": []
+    }
+    buffer = deque()
+    in_competencies = False
+    rpl_apl_count = 0
+
+    def fill(count: int) -> bool:
+        while len(buffer) < count:
+            word = next(words, None)
+            if word is None:
+                return False
+            buffer.append(word)
+        return True
+
+    try:
+        while fill(1):
+            word = buffer[0]
+
+            if not in_competencies:
+                field = HEADER_FIELDS.get(word)
+                if field is not None and fill(2):
+                    buffer.popleft()
+                    employee[field] = buffer.popleft()
+                    continue
+                if word == "RPL/APL":
+                    rpl_apl_count += 1
+                    if rpl_apl_count == 2:  # Second occurrence starts competencies
+                        in_competencies = True
+                buffer.popleft()
+                continue
+
+            # Competency parsing logic
+            if not fill(3) or word in COMPETENCY_SECTION_HEADERS:
+                buffer.popleft()
+                continue
+
+            # Get score part before slash and convert to integer
+            raw_score = buffer[2]
+            employee["Competencies"].append({
+                "Code": buffer[1],
+                "Score": int(raw_score.split('/')[0]) if raw_score else 0
+            })
+            for _ in range(3):
+                buffer.popleft()
+    except Exception as e:
+        where = f"sheet '{sheet_name}'" if sheet_name is not None else "sheet"
+        employee["ParseError"] = f"Could not parse {where}: {e}"
+
+    return employee
+
+
+def iter_excel_employees(excel_content: bytes, workers: int = 1) -> Iterator[dict]:
+    """
+    Yield one parsed employee dict per worksheet. The workbook is opened in
+    openpyxl read-only mode and rows are streamed straight into the parser,
+    so memory use does not grow with the number of sheets.
+
+    With `workers` > 1, workbooks of at least PARALLEL_MIN_SHEETS sheets are
+    parsed by a process pool instead (see iter_excel_employees_parallel).
+    """
+    if workers > 1:
+        sheet_names = workbook_sheet_names(excel_content)
+        if len(sheet_names) >= PARALLEL_MIN_SHEETS:
+            yield from iter_excel_employees_parallel(excel_content, workers, sheet_names)
+            return
+
+    workbook = openpyxl.load_workbook(BytesIO(excel_content), read_only=True, data_only=True)
+    try:
+        for worksheet in workbook.worksheets:
+            yield parse_sheet(_sheet_words(worksheet), worksheet.title)
+    finally:
+        workbook.close()
+
+
+def process_excel_content(excel_content: bytes) -> List[dict]:
+    return list(iter_excel_employees(excel_content))
+
+
+def workbook_sheet_names(excel_content: bytes) -> List[str]:
+    """
+    Sheet names in workbook order, read from the workbook part of the
+    package without loading the workbook itself.
+    """
+    with zipfile.ZipFile(BytesIO(excel_content)) as package:
+        workbook_part = "xl/workbook.xml"
+        if "_rels/.rels" in package.namelist():
+            for rel in ElementTree.fromstring(package.read("_rels/.rels")).iter(f"{_RELATIONSHIPS_NS}Relationship"):
+                if rel.get("Type") == _OFFICE_DOCUMENT_REL:
+                    workbook_part = posixpath.normpath(rel.get("Target").lstrip("/"))
+                    break
+        workbook_xml = ElementTree.fromstring(package.read(workbook_part))
+    return [sheet.get("name") for sheet in workbook_xml.iter(f"{_SPREADSHEET_NS}sheet")]
+
+
+# Worksheets by name, loaded once per pool process by _init_parse_worker
+_worker_sheets = None
+
+
+def _init_parse_worker(excel_content: bytes) -> None:
+    global _worker_sheets
+    workbook = openpyxl.load_workbook(BytesIO(excel_content), read_only=True, data_only=True)
+    _worker_sheets = {worksheet.title: worksheet for worksheet in workbook.worksheets}
+
+
+def _parse_named_sheets(sheet_names: List[str]) -> List[Optional[dict]]:
+    # Chart sheets are not in `worksheets`; the sequential parser skips them too
+    return [
+        parse_sheet(_sheet_words(_worker_sheets[name]), name) if name in _worker_sheets else None
+        for name in sheet_names
+    ]
+
+
+def iter_excel_employees_parallel(
+    excel_content: bytes,
+    workers: int,
+    sheet_names: Optional[List[str]] = None
+) -> Iterator[dict]:
+    """
+    Parse sheets on a pool of `workers` processes. Each process loads the
+    workbook once and parses contiguous runs of sheets; runs are yielded
+    in workbook order, so the output is identical to the sequential parser.
+    """
+    if sheet_names is None:
+        sheet_names = workbook_sheet_names(excel_content)
+    if not sheet_names:
+        return
+
+    # A few runs per worker keeps the processes busy when sheet sizes vary
+    run_size = max(1, -(-len(sheet_names) // (workers * 4)))
+    runs = [sheet_names[i:i + run_size] for i in range(0, len(sheet_names), run_size)]
+
+    # "spawn" avoids forking a process that is running server threads
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_parse_worker,
+        initargs=(excel_content,),
+    ) as pool:
+        for future in [pool.submit(_parse_named_sheets, run) for run in runs]:
+            for employee in future.result():
+                if employee is not None:
+                    yield employee
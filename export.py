@@ -0,0 +1,207 @@
+# export.py
+#
+# Streaming exports for reporting jobs. Rows are read through a server-side
+# cursor in batches of EXPORT_BATCH_SIZE and written straight into the
+# response as NDJSON or CSV, so memory use does not grow with the export.
+import csv
+import io
+import json
+import os
+from typing import Iterator, Literal, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+
+from auth import get_current_user
+from database import SessionLocal
+from jobs import JobQueue, QueueFullError
+from models import Competency, Department, Employee, EmployeeCompetency, Role
+import snapshots
+
+router = APIRouter(
+    prefix="/exports",
+    tags=["exports"],
+)
+
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "5000"))
+
+# One snapshot at a time; a second request while one runs gets a 429
+snapshot_jobs = JobQueue("snapshot", max_workers=1, max_pending=1)
+
+EXPORT_MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def _stream_rows(query, export_format: str) -> Iterator[str]:
+    """
+    Execute `query` on a session of its own and yield the result rendered in
+    `export_format`, one chunk per fetched batch. The request's session is
+    already closed by the time the response body is sent, hence SessionLocal.
+    """
+    with SessionLocal() as db:
+        result = db.execute(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        columns = list(result.keys())
+
+        if export_format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            writer.writerow(columns)
+            for rows in result.partitions():
+                writer.writerows(rows)
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+            if buffer.tell():
+                yield buffer.getvalue()
+            return
+
+        for rows in result.partitions():
+            yield "".join(
+                json.dumps(dict(zip(columns, row)), default=str) + "\n" for row in rows
+            )
+
+
+def _export_response(query, export_format: str, name: str) -> StreamingResponse:
+    return StreamingResponse(
+        _stream_rows(query, export_format),
+        media_type=EXPORT_MEDIA_TYPES[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{name}.{export_format}"'},
+    )
+
+
+@router.get("/employees")
+def export_employees(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    department_code: Optional[str] = None,
+    role_code: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """All employees with department and role names. HODs get their own department only."""
+    if current_user["role"] != "HR":
+        department_code = current_user["department_code"]
+
+    query = (
+        select(
+            Employee.employee_number,
+            Employee.employee_name,
+            Employee.job_code,
+            Employee.reporting_employee_name,
+            Employee.role_code,
+            Role.name.label("role_name"),
+            Employee.department_code,
+            Department.name.label("department_name"),
+            Employee.evaluation_status,
+            Employee.evaluation_by,
+            Employee.last_evaluated_date,
+        )
+        .outerjoin(Role, Role.role_code == Employee.role_code)
+        .outerjoin(Department, Department.department_code == Employee.department_code)
+        .order_by(Employee.employee_number)
+    )
+    if department_code is not None:
+        query = query.where(Employee.department_code == department_code)
+    if role_code is not None:
+        query = query.where(Employee.role_code == role_code)
+
+    return _export_response(query, format, "employees")
+
+
+@router.get("/employee-competencies")
+def export_employee_competencies(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    department_code: Optional[str] = None,
+    competency_code: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    One row per employee competency score, with employee, department and
+    competency names joined in. HODs get their own department only.
+    """
+    if current_user["role"] != "HR":
+        department_code = current_user["department_code"]
+
+    query = (
+        select(
+            EmployeeCompetency.employee_number,
+            Employee.employee_name,
+            Employee.department_code,
+            Department.name.label("department_name"),
+            EmployeeCompetency.competency_code,
+            Competency.name.label("competency_name"),
+            EmployeeCompetency.required_score,
+            EmployeeCompetency.actual_score,
+        )
+        .join(Employee, Employee.employee_number == EmployeeCompetency.employee_number)
+        .outerjoin(Department, Department.department_code == Employee.department_code)
+        .outerjoin(Competency, Competency.code == EmployeeCompetency.competency_code)
+        .order_by(EmployeeCompetency.employee_number, EmployeeCompetency.competency_code)
+    )
+    if department_code is not None:
+        query = query.where(Employee.department_code == department_code)
+    if competency_code is not None:
+        query = query.where(EmployeeCompetency.competency_code == competency_code)
+
+    return _export_response(query, format, "employee-competencies")
+
+
+def _require_hr(current_user: dict) -> None:
+    if current_user["role"] != "HR":
+        raise HTTPException(status_code=403, detail="Only HR can manage snapshots")
+
+
+def _run_snapshot_job(job) -> dict:
+    job.update(tables_done=0, tables_total=len(snapshots.SNAPSHOT_TABLES))
+
+    def table_written(name: str, entry: dict) -> None:
+        job.increment("tables_done")
+        job.update(**{f"{name}_rows": entry["rows"]})
+
+    with SessionLocal() as db:
+        manifest = snapshots.create_snapshot(db, on_table=table_written)
+    return {
+        "createdAt": manifest["createdAt"],
+        "chunksWritten": manifest["chunksWritten"],
+        "chunksReused": manifest["chunksReused"],
+        "rows": {name: table["rows"] for name, table in manifest["tables"].items()},
+    }
+
+
+@router.post("/snapshots", status_code=status.HTTP_202_ACCEPTED)
+def create_snapshot(current_user: dict = Depends(get_current_user)):
+    """
+    Start a Parquet snapshot of the assessment tables into SNAPSHOT_DIR.
+    Only chunks that changed since the previous snapshot are rewritten.
+    """
+    _require_hr(current_user)
+    try:
+        job = snapshot_jobs.submit(_run_snapshot_job)
+    except QueueFullError as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
+
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/exports/snapshots/jobs/{job.id}"
+    }
+
+
+@router.get("/snapshots/jobs/{job_id}")
+def get_snapshot_job(job_id: str, current_user: dict = Depends(get_current_user)):
+    _require_hr(current_user)
+    job = snapshot_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Snapshot job not found")
+    return job.to_dict()
+
+
+@router.get("/snapshots/latest")
+def get_latest_snapshot(current_user: dict = Depends(get_current_user)):
+    """Manifest of the latest snapshot: tables, row counts and chunk files."""
+    _require_hr(current_user)
+    manifest = snapshots.load_manifest()
+    if manifest is None:
+        raise HTTPException(status_code=404, detail="No snapshot has been taken yet")
+    return manifest
@@ -0,0 +1,263 @@
+# gap_analysis.py
+#
+# Vectorised gap analytics. Employee competency scores are aggregated in SQL
+# to one row per (department, competency, gap) with its number of rows, and
+# loaded into NumPy arrays with department and competency codes
+# integer-encoded. Every statistic (histograms, means, percentiles) is then
+# computed with weighted array operations, so the work done in Python
+# depends on the number of distinct groups, not on the number of employees.
+# The largest individual gaps are ordered and limited in SQL.
+#
+# "Gap" is required_score - actual_score. Rows missing either score are
+# unscored and ignored. The 1/2/3 buckets match gap_summary.gap_bucket.
+# "Shortfall" is the gap clipped at zero: exceeding a requirement does not
+# offset a shortfall elsewhere.
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from models import Employee, EmployeeCompetency
+
+GROUP_BY = ("department", "competency")
+
+
+class GapFrame:
+    """
+    Column arrays for a set of employee competency rows:
+    `department` / `competency` are indexes into `department_codes` /
+    `competency_codes`, `scored` marks rows with both scores present and
+    `counts` is the number of employee competencies each row stands for
+    (1 per row when omitted).
+    """
+
+    def __init__(
+        self,
+        department: np.ndarray,
+        department_codes: List[Optional[str]],
+        competency: np.ndarray,
+        competency_codes: List[Optional[str]],
+        gap: np.ndarray,
+        scored: np.ndarray,
+        counts: Optional[np.ndarray] = None,
+    ):
+        self.department = department
+        self.department_codes = department_codes
+        self.competency = competency
+        self.competency_codes = competency_codes
+        self.scored = scored
+        self.counts = np.ones(len(gap), dtype=np.int64) if counts is None else counts
+        self.gap = np.where(scored, gap, 0)
+        self.shortfall = np.maximum(self.gap, 0)
+
+    def __len__(self) -> int:
+        return len(self.gap)
+
+    @property
+    def scored_total(self) -> int:
+        return int(self.counts[self.scored].sum())
+
+    def _groups(self, by: str) -> Tuple[np.ndarray, List[Optional[str]]]:
+        if by == "department":
+            return self.department, self.department_codes
+        if by == "competency":
+            return self.competency, self.competency_codes
+        raise ValueError(f"Unknown grouping '{by}'")
+
+    def _count(self, cells: np.ndarray, weights: np.ndarray, size: int) -> np.ndarray:
+        return np.bincount(cells, weights=weights, minlength=size).astype(np.int64)
+
+    def gap_histogram(self, by: str) -> np.ndarray:
+        """(groups x 3) counts of rows with a gap of exactly 1, 2 and 3."""
+        groups, codes = self._groups(by)
+        in_bucket = self.scored & (self.gap >= 1) & (self.gap <= 3)
+        cells = groups[in_bucket] * 3 + (self.gap[in_bucket] - 1)
+        return self._count(cells, self.counts[in_bucket], len(codes) * 3).reshape(len(codes), 3)
+
+    def pair_gap_histogram(self) -> np.ndarray:
+        """(departments x competencies x 3) gap 1/2/3 counts."""
+        n_comp = len(self.competency_codes)
+        in_bucket = self.scored & (self.gap >= 1) & (self.gap <= 3)
+        cells = (self.department[in_bucket] * n_comp + self.competency[in_bucket]) * 3 + (self.gap[in_bucket] - 1)
+        size = len(self.department_codes) * n_comp * 3
+        return self._count(cells, self.counts[in_bucket], size).reshape(len(self.department_codes), n_comp, 3)
+
+    def scored_counts(self, by: str) -> np.ndarray:
+        groups, codes = self._groups(by)
+        return self._count(groups[self.scored], self.counts[self.scored], len(codes))
+
+    def _group_mean(self, by: str, values: np.ndarray) -> np.ndarray:
+        groups, codes = self._groups(by)
+        weights = values[self.scored] * self.counts[self.scored]
+        totals = np.bincount(groups[self.scored], weights=weights, minlength=len(codes))
+        counts = self.scored_counts(by)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return totals / counts
+
+    def mean_gap(self, by: str) -> np.ndarray:
+        """Mean gap over scored rows per group, negative gaps included (NaN for groups with none)."""
+        return self._group_mean(by, self.gap)
+
+    def mean_shortfall(self, by: str) -> np.ndarray:
+        """Mean shortfall over scored rows per group (NaN for groups with none)."""
+        return self._group_mean(by, self.shortfall)
+
+    def shortfall_percentiles(self, by: str, percentiles: Sequence[float]) -> np.ndarray:
+        """
+        (groups x len(percentiles)) shortfall percentiles over scored rows,
+        with linear interpolation as in np.percentile. All groups are done in
+        one sort: rows are ordered by (group, shortfall), and the value at
+        each percentile's offset inside the group is found by searching the
+        running row counts, so a row standing for several employee
+        competencies is not expanded.
+        """
+        groups, codes = self._groups(by)
+        values = self.shortfall[self.scored]
+        weights = self.counts[self.scored]
+        group_of = groups[self.scored]
+        order = np.lexsort((values, group_of))
+        values = values[order].astype(float)
+        ends = np.cumsum(weights[order])
+
+        counts = self.scored_counts(by)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        result = np.full((len(codes), len(percentiles)), np.nan)
+        has_rows = counts > 0
+        if not has_rows.any():
+            return result
+
+        def value_at(offsets: np.ndarray) -> np.ndarray:
+            return values[np.searchsorted(ends, offsets, side="right")]
+
+        for i, q in enumerate(percentiles):
+            position = (q / 100.0) * (counts[has_rows] - 1)
+            low = np.floor(position).astype(np.int64)
+            high = np.ceil(position).astype(np.int64)
+            base = starts[has_rows]
+            low_values = value_at(base + low)
+            result[has_rows, i] = low_values + (position - low) * (value_at(base + high) - low_values)
+        return result
+
+
+def _encode(value, codes: Dict) -> int:
+    index = codes.get(value)
+    if index is None:
+        index = codes[value] = len(codes)
+    return index
+
+
+def _gap_query(columns: list, competency_code: Optional[str], department_code: Optional[str]):
+    query = select(*columns).outerjoin(Employee, Employee.employee_number == EmployeeCompetency.employee_number)
+    if competency_code is not None:
+        query = query.where(EmployeeCompetency.competency_code == competency_code)
+    if department_code is not None:
+        query = query.where(Employee.department_code == department_code)
+    return query
+
+
+def load_gap_frame(
+    db: Session,
+    competency_code: Optional[str] = None,
+    department_code: Optional[str] = None,
+) -> GapFrame:
+    """
+    Load employee competency rows (optionally for one competency and/or
+    department) into a GapFrame, counted per department, competency and
+    gap by the database.
+    """
+    # NULL when either score is missing, so unscored rows form their own group
+    gap = EmployeeCompetency.required_score - EmployeeCompetency.actual_score
+    query = _gap_query(
+        [Employee.department_code, EmployeeCompetency.competency_code, gap, func.count()],
+        competency_code,
+        department_code,
+    ).group_by(Employee.department_code, EmployeeCompetency.competency_code, gap)
+
+    department_index: Dict[Optional[str], int] = {}
+    competency_index: Dict[Optional[str], int] = {}
+    departments, competencies, gaps, scored, counts = [], [], [], [], []
+    for dept, comp, row_gap, count in db.execute(query):
+        departments.append(_encode(dept, department_index))
+        competencies.append(_encode(comp, competency_index))
+        scored.append(row_gap is not None)
+        gaps.append(row_gap if row_gap is not None else 0)
+        counts.append(count)
+
+    return GapFrame(
+        department=np.array(departments, dtype=np.int64),
+        department_codes=list(department_index),
+        competency=np.array(competencies, dtype=np.int64),
+        competency_codes=list(competency_index),
+        gap=np.array(gaps, dtype=np.int64),
+        scored=np.array(scored, dtype=bool),
+        counts=np.array(counts, dtype=np.int64),
+    )
+
+
+def _number(value: float) -> Optional[float]:
+    return None if np.isnan(value) else round(float(value), 4)
+
+
+def gap_statistics(frame: GapFrame, by: str, percentiles: Sequence[float] = (50, 75, 90)) -> List[dict]:
+    """Per-group histogram, scored count, mean gap, mean shortfall and shortfall percentiles."""
+    _, codes = frame._groups(by)
+    histogram = frame.gap_histogram(by)
+    scored = frame.scored_counts(by)
+    mean_gaps = frame.mean_gap(by)
+    mean_shortfalls = frame.mean_shortfall(by)
+    quantiles = frame.shortfall_percentiles(by, percentiles)
+
+    return [
+        {
+            "code": code,
+            "scoredCount": int(scored[i]),
+            "gap1": int(histogram[i, 0]),
+            "gap2": int(histogram[i, 1]),
+            "gap3": int(histogram[i, 2]),
+            "meanGap": _number(mean_gaps[i]),
+            "meanShortfall": _number(mean_shortfalls[i]),
+            "shortfallPercentiles": {f"p{q:g}": _number(quantiles[i, j]) for j, q in enumerate(percentiles)},
+        }
+        for i, code in enumerate(codes)
+    ]
+
+
+def worst_gaps(
+    db: Session,
+    n: Optional[int] = None,
+    competency_code: Optional[str] = None,
+    department_code: Optional[str] = None,
+) -> List[dict]:
+    """
+    Rows with a positive gap, largest first (ties by employee number and
+    competency code, as in the leaderboard), as API records. Filtered, ordered and limited to `n` rows in the database.
+    """
+    gap = (EmployeeCompetency.required_score - EmployeeCompetency.actual_score).label("gap")
+    query = _gap_query(
+        [
+            EmployeeCompetency.employee_number,
+            Employee.department_code,
+            EmployeeCompetency.competency_code,
+            EmployeeCompetency.required_score,
+            EmployeeCompetency.actual_score,
+            gap,
+        ],
+        competency_code,
+        department_code,
+    ).where(gap > 0).order_by(
+        gap.desc(), EmployeeCompetency.employee_number, EmployeeCompetency.competency_code
+    )
+    if n is not None:
+        query = query.limit(n)
+    return [
+        {
+            "employeeNumber": row.employee_number,
+            "departmentCode": row.department_code,
+            "competencyCode": row.competency_code,
+            "requiredScore": row.required_score,
+            "actualScore": row.actual_score,
+            "gap": row.gap,
+        }
+        for row in db.execute(query)
+    ]
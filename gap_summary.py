@@ -0,0 +1,400 @@
+# gap_summary.py
+#
+# Pre-aggregated analytics. `department_evaluation_summary` holds employee and
+# evaluated counts per department, `department_gap_summary` holds gap 1/2/3
+# counts per department x competency. Write paths capture the affected
+# employees' contributions before and after their change and apply the
+# difference in the same transaction, so analytics reads only touch these rows.
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import bindparam, case, func, insert, update
+from sqlalchemy.orm import Session
+
+from models import (
+    DepartmentEvaluationSummary,
+    DepartmentGapSummary,
+    Employee,
+    EmployeeCompetency,
+)
+
+
+def gap_bucket(required_score: Optional[int], actual_score: Optional[int]) -> Optional[int]:
+    """Index (0, 1, 2) of the gap bucket for a score pair, or None if it is not a 1/2/3 gap."""
+    if required_score is None or actual_score is None:
+        return None
+    gap = required_score - actual_score
+    if gap in (1, 2, 3):
+        return gap - 1
+    return None
+
+
+def gap_bucket_columns():
+    """
+    SUM(CASE ...) columns counting employee competencies whose gap
+    (required_score - actual_score) is exactly 1, 2 or 3. Rows with a
+    missing score produce a NULL gap and fall through to the ELSE branch.
+    """
+    gap = EmployeeCompetency.required_score - EmployeeCompetency.actual_score
+    return (
+        func.sum(case((gap == 1, 1), else_=0)).label("gap1"),
+        func.sum(case((gap == 2, 1), else_=0)).label("gap2"),
+        func.sum(case((gap == 3, 1), else_=0)).label("gap3"),
+    )
+
+
+# ---------------------------------------------------------------------------
+# Live aggregation over the base tables
+# ---------------------------------------------------------------------------
+
+def department_gap_histogram(db: Session) -> Dict[str, Any]:
+    """Gap 1/2/3 counts per department, in a single GROUP BY over employee_competencies."""
+    rows = db.query(Employee.department_code, *gap_bucket_columns()).join(
+        Employee, Employee.employee_number == EmployeeCompetency.employee_number
+    ).group_by(Employee.department_code).all()
+    return {row.department_code: row for row in rows}
+
+
+def competency_gap_histogram(db: Session) -> Dict[str, Any]:
+    """Gap 1/2/3 counts per competency, in a single GROUP BY over employee_competencies."""
+    rows = db.query(EmployeeCompetency.competency_code, *gap_bucket_columns()).group_by(
+        EmployeeCompetency.competency_code
+    ).all()
+    return {row.competency_code: row for row in rows}
+
+
+def department_competency_gap_histogram(db: Session) -> Dict[Tuple[str, str], Any]:
+    """Gap 1/2/3 counts per (department, competency) pair."""
+    rows = db.query(
+        Employee.department_code, EmployeeCompetency.competency_code, *gap_bucket_columns()
+    ).join(
+        Employee, Employee.employee_number == EmployeeCompetency.employee_number
+    ).group_by(Employee.department_code, EmployeeCompetency.competency_code).all()
+    return {(row.department_code, row.competency_code): row for row in rows}
+
+
+def department_employee_counts(db: Session) -> Dict[str, Any]:
+    """Employee and evaluated-employee counts per department."""
+    rows = db.query(
+        Employee.department_code,
+        func.count().label("employee_count"),
+        func.sum(case((Employee.evaluation_status == True, 1), else_=0)).label("evaluated_count"),
+    ).group_by(Employee.department_code).all()
+    return {row.department_code: row for row in rows}
+
+
+# ---------------------------------------------------------------------------
+# Reads over the summary tables
+# ---------------------------------------------------------------------------
+
+def summary_totals(db: Session, department_code: Optional[str] = None) -> Tuple[int, int]:
+    """(total employees, evaluated employees) across all departments, or within one."""
+    query = db.query(
+        func.coalesce(func.sum(DepartmentEvaluationSummary.employee_count), 0).label("total"),
+        func.coalesce(func.sum(DepartmentEvaluationSummary.evaluated_count), 0).label("evaluated"),
+    )
+    if department_code is not None:
+        query = query.filter(DepartmentEvaluationSummary.department_code == department_code)
+    row = query.one()
+    return int(row.total), int(row.evaluated)
+
+
+def summary_department_counts(db: Session, department_code: Optional[str] = None) -> Dict[str, Any]:
+    query = db.query(
+        DepartmentEvaluationSummary.department_code,
+        DepartmentEvaluationSummary.employee_count,
+        DepartmentEvaluationSummary.evaluated_count,
+    )
+    if department_code is not None:
+        query = query.filter(DepartmentEvaluationSummary.department_code == department_code)
+    return {row.department_code: row for row in query.all()}
+
+
+def summary_department_gaps(db: Session, department_code: Optional[str] = None) -> Dict[str, Any]:
+    query = db.query(
+        DepartmentGapSummary.department_code,
+        func.sum(DepartmentGapSummary.gap1).label("gap1"),
+        func.sum(DepartmentGapSummary.gap2).label("gap2"),
+        func.sum(DepartmentGapSummary.gap3).label("gap3"),
+    )
+    if department_code is not None:
+        query = query.filter(DepartmentGapSummary.department_code == department_code)
+    rows = query.group_by(DepartmentGapSummary.department_code).all()
+    return {row.department_code: row for row in rows}
+
+
+def summary_competency_gaps(db: Session, department_code: Optional[str] = None) -> Dict[str, Any]:
+    query = db.query(
+        DepartmentGapSummary.competency_code,
+        func.sum(DepartmentGapSummary.gap1).label("gap1"),
+        func.sum(DepartmentGapSummary.gap2).label("gap2"),
+        func.sum(DepartmentGapSummary.gap3).label("gap3"),
+    )
+    if department_code is not None:
+        query = query.filter(DepartmentGapSummary.department_code == department_code)
+    rows = query.group_by(DepartmentGapSummary.competency_code).all()
+    return {row.competency_code: row for row in rows}
+
+
+# ---------------------------------------------------------------------------
+# Incremental maintenance
+# ---------------------------------------------------------------------------
+
+def contribution_from_rows(
+    department_code: str,
+    evaluated: bool,
+    competency_rows: Iterable[Tuple[str, Optional[int], Optional[int]]],
+) -> dict:
+    """
+    Build an employee's summary contribution from in-memory data.
+    `competency_rows` yields (competency_code, required_score, actual_score).
+    """
+    gaps: Dict[str, List[int]] = {}
+    for competency_code, required_score, actual_score in competency_rows:
+        bucket = gap_bucket(required_score, actual_score)
+        if bucket is not None:
+            gaps.setdefault(competency_code, [0, 0, 0])[bucket] += 1
+    return {"department_code": department_code, "evaluated": bool(evaluated), "gaps": gaps}
+
+
+def employee_contributions(db: Session, employee_numbers: Iterable[str]) -> Dict[str, dict]:
+    """
+    Current summary contribution of each listed employee, read from the
+    base tables. Pending changes must be flushed before calling this.
+    """
+    employee_numbers = list(set(employee_numbers))
+    if not employee_numbers:
+        return {}
+
+    contributions = {}
+    for emp in db.query(
+        Employee.employee_number, Employee.department_code, Employee.evaluation_status
+    ).filter(Employee.employee_number.in_(employee_numbers)).all():
+        contributions[emp.employee_number] = {
+            "department_code": emp.department_code,
+            "evaluated": bool(emp.evaluation_status),
+            "gaps": {},
+        }
+
+    rows = db.query(
+        EmployeeCompetency.employee_number, EmployeeCompetency.competency_code, *gap_bucket_columns()
+    ).filter(
+        EmployeeCompetency.employee_number.in_(list(contributions))
+    ).group_by(EmployeeCompetency.employee_number, EmployeeCompetency.competency_code).all()
+
+    for row in rows:
+        counts = [int(row.gap1 or 0), int(row.gap2 or 0), int(row.gap3 or 0)]
+        if any(counts):
+            contributions[row.employee_number]["gaps"][row.competency_code] = counts
+
+    return contributions
+
+
+def apply_changes(db: Session, before: Dict[str, dict], after: Dict[str, dict]) -> None:
+    """
+    Move the summary tables from the `before` contributions to the `after`
+    contributions (both keyed by employee number; a missing key means the
+    employee did not exist on that side). Runs inside the caller's
+    transaction and does not commit.
+    """
+    evaluation_delta: Dict[str, List[int]] = {}
+    gap_delta: Dict[Tuple[str, str], List[int]] = {}
+
+    def accumulate(contribution: dict, sign: int) -> None:
+        dept = contribution["department_code"]
+        counts = evaluation_delta.setdefault(dept, [0, 0])
+        counts[0] += sign
+        counts[1] += sign if contribution["evaluated"] else 0
+        for competency_code, buckets in contribution["gaps"].items():
+            delta = gap_delta.setdefault((dept, competency_code), [0, 0, 0])
+            for i in range(3):
+                delta[i] += sign * buckets[i]
+
+    for contribution in before.values():
+        accumulate(contribution, -1)
+    for contribution in after.values():
+        accumulate(contribution, 1)
+
+    evaluation_delta = {k: v for k, v in evaluation_delta.items() if any(v)}
+    gap_delta = {k: v for k, v in gap_delta.items() if any(v)}
+
+    if evaluation_delta:
+        _apply_evaluation_delta(db, evaluation_delta)
+    if gap_delta:
+        _apply_gap_delta(db, gap_delta)
+
+
+def apply_gap_delta(db: Session, delta: Dict[Tuple[str, str], List[int]]) -> None:
+    """
+    Add gap 1/2/3 count deltas keyed by (department, competency) for changes
+    that do not go through employee contributions (set-based deletes, ...).
+    Does not commit.
+    """
+    delta = {k: v for k, v in delta.items() if any(v)}
+    if delta:
+        _apply_gap_delta(db, delta)
+
+
+def _apply_evaluation_delta(db: Session, delta: Dict[str, List[int]]) -> None:
+    table = DepartmentEvaluationSummary.__table__
+    existing = {
+        row[0] for row in db.query(DepartmentEvaluationSummary.department_code).filter(
+            DepartmentEvaluationSummary.department_code.in_(list(delta))
+        ).all()
+    }
+
+    updates = [
+        {"b_dept": dept, "b_employees": counts[0], "b_evaluated": counts[1]}
+        for dept, counts in delta.items() if dept in existing
+    ]
+    inserts = [
+        {"department_code": dept, "employee_count": counts[0], "evaluated_count": counts[1]}
+        for dept, counts in delta.items() if dept not in existing
+    ]
+
+    if updates:
+        db.execute(
+            update(table)
+            .where(table.c.department_code == bindparam("b_dept"))
+            .values(
+                employee_count=table.c.employee_count + bindparam("b_employees"),
+                evaluated_count=table.c.evaluated_count + bindparam("b_evaluated"),
+            ),
+            updates,
+        )
+    if inserts:
+        db.execute(insert(table), inserts)
+
+
+def _apply_gap_delta(db: Session, delta: Dict[Tuple[str, str], List[int]]) -> None:
+    table = DepartmentGapSummary.__table__
+    departments = {dept for dept, _ in delta}
+    competencies = {comp for _, comp in delta}
+    existing = {
+        (row[0], row[1]) for row in db.query(
+            DepartmentGapSummary.department_code, DepartmentGapSummary.competency_code
+        ).filter(
+            DepartmentGapSummary.department_code.in_(list(departments)),
+            DepartmentGapSummary.competency_code.in_(list(competencies)),
+        ).all()
+    }
+
+    updates = [
+        {"b_dept": dept, "b_comp": comp, "b_gap1": d[0], "b_gap2": d[1], "b_gap3": d[2]}
+        for (dept, comp), d in delta.items() if (dept, comp) in existing
+    ]
+    inserts = [
+        {"department_code": dept, "competency_code": comp, "gap1": d[0], "gap2": d[1], "gap3": d[2]}
+        for (dept, comp), d in delta.items() if (dept, comp) not in existing
+    ]
+
+    if updates:
+        db.execute(
+            update(table)
+            .where(
+                table.c.department_code == bindparam("b_dept"),
+                table.c.competency_code == bindparam("b_comp"),
+            )
+            .values(
+                gap1=table.c.gap1 + bindparam("b_gap1"),
+                gap2=table.c.gap2 + bindparam("b_gap2"),
+                gap3=table.c.gap3 + bindparam("b_gap3"),
+            ),
+            updates,
+        )
+    if inserts:
+        db.execute(insert(table), inserts)
+
+
+# ---------------------------------------------------------------------------
+# Rebuild and drift detection
+# ---------------------------------------------------------------------------
+
+def _live_summary(db: Session) -> Tuple[Dict[str, Tuple[int, int]], Dict[Tuple[str, str], Tuple[int, int, int]]]:
+    evaluation = {
+        dept: (row.employee_count, int(row.evaluated_count or 0))
+        for dept, row in department_employee_counts(db).items()
+    }
+    gaps = {
+        key: (int(row.gap1 or 0), int(row.gap2 or 0), int(row.gap3 or 0))
+        for key, row in department_competency_gap_histogram(db).items()
+    }
+    return evaluation, gaps
+
+
+def _stored_summary(db: Session) -> Tuple[Dict[str, Tuple[int, int]], Dict[Tuple[str, str], Tuple[int, int, int]]]:
+    evaluation = {
+        row.department_code: (row.employee_count, row.evaluated_count)
+        for row in db.query(DepartmentEvaluationSummary).all()
+    }
+    gaps = {
+        (row.department_code, row.competency_code): (row.gap1, row.gap2, row.gap3)
+        for row in db.query(DepartmentGapSummary).all()
+    }
+    return evaluation, gaps
+
+
+def rebuild(db: Session) -> dict:
+    """Recompute both summary tables from scratch. Does not commit."""
+    evaluation, gaps = _live_summary(db)
+
+    db.query(DepartmentEvaluationSummary).delete(synchronize_session=False)
+    db.query(DepartmentGapSummary).delete(synchronize_session=False)
+
+    if evaluation:
+        db.execute(insert(DepartmentEvaluationSummary.__table__), [
+            {"department_code": dept, "employee_count": counts[0], "evaluated_count": counts[1]}
+            for dept, counts in evaluation.items()
+        ])
+    nonzero_gaps = {key: counts for key, counts in gaps.items() if any(counts)}
+    if nonzero_gaps:
+        db.execute(insert(DepartmentGapSummary.__table__), [
+            {"department_code": dept, "competency_code": comp, "gap1": c[0], "gap2": c[1], "gap3": c[2]}
+            for (dept, comp), c in nonzero_gaps.items()
+        ])
+
+    return {"departments": len(evaluation), "gap_rows": len(nonzero_gaps)}
+
+
+def drift(db: Session) -> List[dict]:
+    """
+    Differences between the stored summary rows and a live aggregation.
+    All-zero rows are treated the same as missing rows.
+    """
+    live_evaluation, live_gaps = _live_summary(db)
+    stored_evaluation, stored_gaps = _stored_summary(db)
+    mismatches = []
+
+    for dept in sorted(set(live_evaluation) | set(stored_evaluation), key=str):
+        live = live_evaluation.get(dept, (0, 0))
+        stored = stored_evaluation.get(dept, (0, 0))
+        if live != stored:
+            mismatches.append({
+                "table": DepartmentEvaluationSummary.__tablename__,
+                "departmentCode": dept,
+                "expected": {"employeeCount": live[0], "evaluatedCount": live[1]},
+                "actual": {"employeeCount": stored[0], "evaluatedCount": stored[1]},
+            })
+
+    for key in sorted(set(live_gaps) | set(stored_gaps), key=str):
+        live = live_gaps.get(key, (0, 0, 0))
+        stored = stored_gaps.get(key, (0, 0, 0))
+        if live != stored:
+            mismatches.append({
+                "table": DepartmentGapSummary.__tablename__,
+                "departmentCode": key[0],
+                "competencyCode": key[1],
+                "expected": {"gap1": live[0], "gap2": live[1], "gap3": live[2]},
+                "actual": {"gap1": stored[0], "gap2": stored[1], "gap3": stored[2]},
+            })
+
+    return mismatches
+
+
+def ensure_populated(db: Session) -> None:
+    """Build the summary tables for databases created before they existed."""
+    if db.query(DepartmentEvaluationSummary.department_code).first() is not None:
+        return
+    if db.query(Employee.employee_number).first() is None:
+        return
+    rebuild(db)
+    db.commit()
@@ -0,0 +1,106 @@
+# jobs.py
+#
+# Minimal in-process background job queue. Long-running work (workbook
+# uploads, ...) is submitted here and executed on a bounded worker pool while
+# the request returns a job id that clients poll for progress.
+import threading
+import traceback
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Optional
+
+
+class QueueFullError(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, kind: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = "queued"
+        self.created_at = datetime.utcnow()
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.progress: dict = {}
+        self.result = None
+        self.error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def update(self, **progress) -> None:
+        with self._lock:
+            self.progress.update(progress)
+
+    def increment(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self.progress[key] = self.progress.get(key, 0) + amount
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "job_id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "created_at": self.created_at.isoformat(),
+                "started_at": self.started_at.isoformat() if self.started_at else None,
+                "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+                "progress": dict(self.progress),
+                "result": self.result,
+                "error": self.error,
+            }
+
+
+class JobQueue:
+    """
+    Runs `fn(job, *args)` on a pool of `max_workers` threads. At most
+    `max_pending` jobs may be queued or running at once; further submissions
+    raise QueueFullError. The last `keep_finished` finished jobs stay
+    queryable.
+    """
+
+    def __init__(self, kind: str, max_workers: int = 2, max_pending: int = 16, keep_finished: int = 100):
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.keep_finished = keep_finished
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{kind}-job")
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._active = 0
+        self._lock = threading.Lock()
+
+    def submit(self, fn: Callable, *args) -> Job:
+        job = Job(self.kind)
+        with self._lock:
+            if self._active >= self.max_pending:
+                raise QueueFullError(f"Too many {self.kind} jobs in progress, try again later")
+            self._active += 1
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, fn, args)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def _run(self, job: Job, fn: Callable, args: tuple) -> None:
+        job.status = "running"
+        job.started_at = datetime.utcnow()
+        try:
+            job.result = fn(job, *args)
+            job.status = "completed"
+        except Exception as e:
+            traceback.print_exc()
+            job.error = str(e)
+            job.status = "failed"
+        finally:
+            job.finished_at = datetime.utcnow()
+            with self._lock:
+                self._active -= 1
+                self._prune()
+
+    def _prune(self) -> None:
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished_at is not None]
+        for job_id in finished[:max(0, len(finished) - self.keep_finished)]:
+            del self._jobs[job_id]
@@ -1,15 +1,32 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import auth
 import competency
-from database import engine, Base
+from database import SessionLocal, async_engine, engine, Base
+import gap_summary
+import metrics
+import refdata
+import migrations
 import department
+import export
 from sqlalchemy.orm import Session
 import stats
 
 import employee
+import evaluation_history
 import role
-app = FastAPI()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Close pooled async connections so their driver threads let the process exit
+    await async_engine.dispose()
+
+
+app = FastAPI(lifespan=lifespan)
 origins = [
     "http://localhost:5173",  # React app running on Vite
     "http://127.0.0.1:5173",  # Alternative localhost
@@ -21,12 +38,28 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all HTTP methods (GET, POST, etc.)
     allow_headers=["*"],  # Allows all headers
+    expose_headers=["ETag", "X-Next-Cursor", "X-Total-Count", "X-Propagated-Rows", "X-Propagation-Job", "Server-Timing"],  # Readable by the frontend
 )
 
+# Per-route latency and database statistics, served on /metrics
+app.add_middleware(metrics.MetricsMiddleware)
+
 
 # Create tables
 Base.metadata.create_all(bind=engine)
 
+# Add columns and indexes declared after the tables were first created
+migrations.ensure_columns(engine)
+for skipped in migrations.ensure_indexes(engine)["skipped"]:
+    print(f"Skipped unique index {skipped['index']}: duplicate keys {skipped['duplicates']}")
+
+# Backfill analytics summaries and evaluation history for databases created before they existed
+with SessionLocal() as db:
+    gap_summary.ensure_populated(db)
+    evaluation_history.ensure_backfilled(db)
+    # Departments, roles and competencies are served from memory
+    refdata.refresh(db)
+
 # Include authentication routes
 app.include_router(auth.router)
 app.include_router(role.router)
@@ -34,6 +67,8 @@ app.include_router(department.router)
 app.include_router(competency.router)
 app.include_router(employee.router)
 app.include_router(stats.router)
+app.include_router(export.router)
+app.include_router(metrics.router)
 
 
     
\ No newline at end of file
@@ -0,0 +1,259 @@
+# metrics.py
+#
+# Per-request instrumentation. An ASGI middleware opens a RequestStats for
+# every HTTP request; SQLAlchemy event hooks add each statement's count,
+# time and rows to the stats of the request that issued it (found through a
+# context variable, which follows the request into worker threads). Totals
+# are kept per route and served in Prometheus text format on /metrics, and
+# every response carries a Server-Timing header.
+#
+# Rows are rows fetched from SELECT cursors (ORM entities and column-only
+# queries alike, counted as the result reads them) plus rows affected by
+# INSERT/UPDATE/DELETE.
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger("metrics")
+
+# Requests slower than this are logged with their SQL; unset disables the log
+SLOW_REQUEST_MS = float(os.getenv("SLOW_REQUEST_MS")) if os.getenv("SLOW_REQUEST_MS") else None
+SLOW_REQUEST_MAX_STATEMENTS = int(os.getenv("SLOW_REQUEST_MAX_STATEMENTS", "50"))
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+UNMATCHED_ROUTE = "<unmatched>"
+
+
+class RequestStats:
+    __slots__ = ("started", "queries", "db_time", "rows", "statements")
+
+    def __init__(self, capture_statements: bool):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.rows = 0
+        self.statements: Optional[List[Tuple[float, str]]] = [] if capture_statements else None
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_stats() -> Optional[RequestStats]:
+    return _current.get()
+
+
+# ---------------------------------------------------------------------------
+# SQLAlchemy hooks (all engines, sync and async)
+# ---------------------------------------------------------------------------
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("metrics_query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    if stats is None:
+        return
+    starts = conn.info.get("metrics_query_start")
+    if not starts:
+        return
+    elapsed = time.perf_counter() - starts.pop()
+    stats.queries += 1
+    stats.db_time += elapsed
+    if context is not None and (context.isinsert or context.isupdate or context.isdelete):
+        stats.rows += max(cursor.rowcount, 0)
+    elif context is not None and cursor.description is not None:
+        # The result is built from context.cursor after this hook returns
+        context.cursor = _CountingCursor(cursor, stats)
+    if stats.statements is not None and len(stats.statements) < SLOW_REQUEST_MAX_STATEMENTS:
+        stats.statements.append((elapsed, statement))
+
+
+class _CountingCursor:
+    """DB-API cursor proxy adding the rows fetched through it to a RequestStats."""
+    __slots__ = ("_cursor", "_stats")
+
+    def __init__(self, cursor, stats: RequestStats):
+        object.__setattr__(self, "_cursor", cursor)
+        object.__setattr__(self, "_stats", stats)
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        if row is not None:
+            self._stats.rows += 1
+        return row
+
+    def fetchmany(self, *args, **kwargs):
+        rows = self._cursor.fetchmany(*args, **kwargs)
+        self._stats.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._stats.rows += len(rows)
+        return rows
+
+    def __iter__(self):
+        for row in self._cursor:
+            self._stats.rows += 1
+            yield row
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._cursor, name, value)
+
+
+# ---------------------------------------------------------------------------
+# Per-route aggregation
+# ---------------------------------------------------------------------------
+
+class RouteMetrics:
+    __slots__ = ("buckets", "count", "duration", "queries", "db_time", "rows")
+
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.duration = 0.0
+        self.queries = 0
+        self.db_time = 0.0
+        self.rows = 0
+
+
+_routes: Dict[Tuple[str, str, int], RouteMetrics] = {}
+_routes_lock = threading.Lock()
+
+
+def record(method: str, route: str, status: int, duration: float, stats: RequestStats) -> None:
+    key = (method, route, status)
+    with _routes_lock:
+        metrics = _routes.get(key)
+        if metrics is None:
+            metrics = _routes[key] = RouteMetrics()
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if duration <= bound:
+                metrics.buckets[i] += 1
+        metrics.count += 1
+        metrics.duration += duration
+        metrics.queries += stats.queries
+        metrics.db_time += stats.db_time
+        metrics.rows += stats.rows
+
+
+def _label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def render_prometheus() -> str:
+    with _routes_lock:
+        snapshot = {
+            key: (list(m.buckets), m.count, m.duration, m.queries, m.db_time, m.rows)
+            for key, m in _routes.items()
+        }
+
+    lines = [
+        "# HELP http_request_duration_seconds Request latency by route.",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    for (method, route, status), (buckets, count, duration, _, _, _) in sorted(snapshot.items()):
+        labels = f'method="{_label(method)}",route="{_label(route)}",status="{status}"'
+        for bound, bucket_count in zip(LATENCY_BUCKETS, buckets):
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {bucket_count}')
+        lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {count}')
+        lines.append(f"http_request_duration_seconds_sum{{{labels}}} {duration}")
+        lines.append(f"http_request_duration_seconds_count{{{labels}}} {count}")
+
+    counters = (
+        ("http_request_db_queries_total", "Database statements executed by route.", 3),
+        ("http_request_db_seconds_total", "Time spent in database statements by route.", 4),
+        ("http_request_db_rows_total", "Rows fetched plus rows written by route.", 5),
+    )
+    for name, help_text, index in counters:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} counter")
+        for (method, route, status), values in sorted(snapshot.items()):
+            labels = f'method="{_label(method)}",route="{_label(route)}",status="{status}"'
+            lines.append(f"{name}{{{labels}}} {values[index]}")
+
+    return "\n".join(lines) + "\n"
+
+
+def reset() -> None:
+    with _routes_lock:
+        _routes.clear()
+
+
+# ---------------------------------------------------------------------------
+# Middleware and endpoint
+# ---------------------------------------------------------------------------
+
+class MetricsMiddleware:
+    """Pure ASGI middleware, so streaming responses are timed to their last byte."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(capture_statements=SLOW_REQUEST_MS is not None)
+        token = _current.set(stats)
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                elapsed_ms = (time.perf_counter() - stats.started) * 1000
+                server_timing = (
+                    f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries", '
+                    f"app;dur={elapsed_ms:.1f}"
+                )
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", server_timing.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            duration = time.perf_counter() - stats.started
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or UNMATCHED_ROUTE
+            record(scope["method"], route_path, status_code, duration, stats)
+            if SLOW_REQUEST_MS is not None and duration * 1000 >= SLOW_REQUEST_MS:
+                _log_slow_request(scope, status_code, duration, stats)
+
+
+def _log_slow_request(scope, status_code: int, duration: float, stats: RequestStats) -> None:
+    statements = "\n".join(
+        f"  [{elapsed * 1000:.1f} ms] {' '.join(statement.split())}" for elapsed, statement in stats.statements
+    )
+    logger.warning(
+        "Slow request %s %s -> %s in %.1f ms (%d queries, %.1f ms in db, %d rows)\n%s",
+        scope["method"], scope["path"], status_code, duration * 1000,
+        stats.queries, stats.db_time * 1000, stats.rows, statements
+    )
+
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
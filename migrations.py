@@ -0,0 +1,90 @@
+# migrations.py
+#
+# Brings an existing database up to the columns and indexes declared in
+# models.py. Base.metadata.create_all only creates missing tables, so columns
+# and indexes added to tables that already exist (e.g. in test.db) are
+# created here instead.
+#
+# Runs at application startup; can also be run directly:
+#     python migrations.py
+import sys
+from typing import Dict, List
+
+from sqlalchemy import func, inspect, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.schema import CreateColumn
+
+from database import Base, engine
+import models  # noqa: F401  (registers the tables on Base.metadata)
+
+
+def ensure_columns(bind: Engine = engine) -> List[str]:
+    """
+    Add every column declared on the models that is missing from its
+    table. New columns must be nullable or carry a server_default.
+    """
+    inspector = inspect(bind)
+    added = []
+
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        missing = [column for column in table.columns if column.name not in existing]
+        if not missing:
+            continue
+        with bind.begin() as connection:
+            for column in missing:
+                ddl = CreateColumn(column).compile(dialect=bind.dialect)
+                connection.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+                added.append(f"{table.name}.{column.name}")
+
+    return added
+
+
+def _duplicate_keys(bind: Engine, index) -> List[tuple]:
+    """Up to five key values that would violate a unique index."""
+    columns = list(index.columns)
+    query = select(*columns).group_by(*columns).having(func.count() > 1).limit(5)
+    with bind.connect() as connection:
+        return [tuple(row) for row in connection.execute(query)]
+
+
+def ensure_indexes(bind: Engine = engine) -> Dict[str, list]:
+    """
+    Create every index declared on the models that is missing from the
+    database. Unique indexes whose columns already hold duplicate values
+    are skipped and reported instead of failing the migration.
+    """
+    inspector = inspect(bind)
+    created = []
+    skipped = []
+
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+
+        for index in sorted(table.indexes, key=lambda ix: ix.name):
+            if index.name in existing:
+                continue
+            if index.unique:
+                duplicates = _duplicate_keys(bind, index)
+                if duplicates:
+                    skipped.append({"index": index.name, "duplicates": duplicates})
+                    continue
+            index.create(bind)
+            created.append(index.name)
+
+    return {"created": created, "skipped": skipped}
+
+
+if __name__ == "__main__":
+    for name in ensure_columns():
+        print(f"added column {name}")
+    result = ensure_indexes()
+    for name in result["created"]:
+        print(f"created index {name}")
+    for item in result["skipped"]:
+        print(f"skipped unique index {item['index']}: duplicate keys {item['duplicates']}", file=sys.stderr)
+    sys.exit(1 if result["skipped"] else 0)
@@ -1,4 +1,4 @@
-from sqlalchemy import Boolean, Column, Date, Integer, String, ForeignKey
+from sqlalchemy import Boolean, Column, Date, DateTime, Index, Integer, String, ForeignKey
 from database import Base
 
 class Department(Base):
@@ -34,6 +34,11 @@ class RoleCompetency(Base):
     competency_code = Column(String, ForeignKey("competencies.code"))
     required_score = Column(Integer)
 
+    __table_args__ = (
+        # Role -> competency lookups, and membership checks on assignment
+        Index("ix_role_competencies_role_competency", "role_code", "competency_code"),
+    )
+
 
 
 class Employee(Base):
@@ -48,6 +53,15 @@ class Employee(Base):
     evaluation_by = Column(String, nullable=True)  # Explicitly nullable
     last_evaluated_date = Column(Date, nullable=True)  # Explicitly nullable
 
+    __table_args__ = (
+        # Department scoping (HOD listings, analytics) and evaluated counts per department
+        Index("ix_employees_department_status", "department_code", "evaluation_status"),
+        Index("ix_employees_role_code", "role_code"),
+        # Name sort / prefix search and evaluated-date range filters on the listing
+        Index("ix_employees_employee_name", "employee_name"),
+        Index("ix_employees_last_evaluated_date", "last_evaluated_date"),
+    )
+
 
 
 class EmployeeCompetency(Base):
@@ -58,6 +72,13 @@ class EmployeeCompetency(Base):
     required_score = Column(Integer)
     actual_score = Column(Integer)
 
+    __table_args__ = (
+        # One row per employee and competency; serves per-employee lookups
+        Index("uq_employee_competencies_employee_competency", "employee_number", "competency_code", unique=True),
+        # Per-competency scans (analytics) without touching the table rows
+        Index("ix_employee_competencies_competency_employee", "competency_code", "employee_number"),
+    )
+
 
 
 
@@ -75,4 +96,50 @@ class User(Base):
     email = Column(String, unique=True, index=True)
     hashed_password = Column(String)
     role = Column(String)  # HR or HOD
-    department_code = Column(Integer, ForeignKey("departments.department_code"))
\ No newline at end of file
+    department_code = Column(Integer, ForeignKey("departments.department_code"))
+    # Bumped to revoke every token issued to the user so far
+    token_version = Column(Integer, default=0, server_default="0", nullable=False)
+
+
+class DepartmentEvaluationSummary(Base):
+    __tablename__ = "department_evaluation_summary"
+    department_code = Column(String, primary_key=True)
+    employee_count = Column(Integer, default=0)
+    evaluated_count = Column(Integer, default=0)
+
+
+class DepartmentGapSummary(Base):
+    __tablename__ = "department_gap_summary"
+    department_code = Column(String, primary_key=True)
+    competency_code = Column(String, primary_key=True)
+    gap1 = Column(Integer, default=0)
+    gap2 = Column(Integer, default=0)
+    gap3 = Column(Integer, default=0)
+
+
+class EvaluationHistory(Base):
+    """
+    Append-only log of submitted scores; employee_competencies holds the
+    latest. Keyed by value rather than by foreign keys, so deleting an
+    employee or competency keeps its past evaluations in the trends.
+    """
+    __tablename__ = "evaluation_history"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    employee_number = Column(String, nullable=False)
+    # Department at evaluation time, so trends survive transfers
+    department_code = Column(String)
+    competency_code = Column(String, nullable=False)
+    required_score = Column(Integer)
+    actual_score = Column(Integer)
+    evaluated_at = Column(DateTime, nullable=False)
+    evaluated_by = Column(String)
+    # Review cycle label, e.g. "2026-H2"
+    cycle = Column(String, nullable=False)
+
+    __table_args__ = (
+        # Latest score per employee competency as of a date
+        Index("ix_evaluation_history_employee_competency_time", "employee_number", "competency_code", "evaluated_at"),
+        # Time-range scans for trends
+        Index("ix_evaluation_history_evaluated_at", "evaluated_at"),
+        Index("ix_evaluation_history_cycle_department", "cycle", "department_code"),
+    )
@@ -0,0 +1,24 @@
+# pagination.py
+#
+# Opaque keyset cursors shared by the paginated endpoints. A cursor is the
+# sort key of the last row returned, as URL-safe base64 of a JSON list.
+import base64
+import binascii
+import json
+
+from fastapi import HTTPException
+
+
+def encode_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def decode_cursor(cursor: str, length: int) -> list:
+    """Decode a cursor holding `length` values; malformed cursors are a 400."""
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, binascii.Error):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if not isinstance(values, list) or len(values) != length:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return values
@@ -0,0 +1,166 @@
+# refdata.py
+#
+# Process-wide cache of the reference data: departments, roles, competencies
+# and the role -> competency assignments. The tables are tiny and rarely
+# written, so they are loaded whole into immutable records indexed by code
+# and id, and swapped in as one snapshot on every reload. The department,
+# role and competency routers call refresh() after their writes; other
+# worker processes pick changes up on a lookup miss or after
+# REFDATA_TTL_SECONDS.
+import os
+import threading
+import time
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import Competency, Department, Role, RoleCompetency
+
+REFDATA_TTL_SECONDS = float(os.getenv("REFDATA_TTL_SECONDS", "300"))
+# A lookup miss reloads at most this often, so unknown codes cannot force a
+# reload per request
+REFDATA_MISS_RELOAD_SECONDS = float(os.getenv("REFDATA_MISS_RELOAD_SECONDS", "1"))
+
+
+class _Record:
+    """Immutable record: values are set once by the constructor."""
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+
+class DepartmentRecord(_Record):
+    __slots__ = ("id", "code", "name")
+
+
+class RoleRecord(_Record):
+    __slots__ = ("id", "code", "name")
+
+
+class CompetencyRecord(_Record):
+    __slots__ = ("id", "code", "name", "description", "required_score")
+
+
+class RoleCompetencyRecord(_Record):
+    __slots__ = ("competency_code", "required_score")
+
+
+class ReferenceData(_Record):
+    """
+    One consistent snapshot. Dicts keep the tables' id order; a role's
+    competencies are listed once each, in assignment order, with the
+    required score of the first assignment.
+    """
+    __slots__ = (
+        "departments", "departments_by_id",
+        "roles", "roles_by_id",
+        "competencies", "competencies_by_id",
+        "role_competencies", "loaded_at",
+    )
+
+    def department(self, code: Optional[str]) -> Optional[DepartmentRecord]:
+        return self.departments.get(code)
+
+    def role(self, code: Optional[str]) -> Optional[RoleRecord]:
+        return self.roles.get(code)
+
+    def competency(self, code: Optional[str]) -> Optional[CompetencyRecord]:
+        return self.competencies.get(code)
+
+    def competencies_for_role(self, role_code: Optional[str]) -> Tuple[RoleCompetencyRecord, ...]:
+        return self.role_competencies.get(role_code, ())
+
+
+def _load(db: Session) -> ReferenceData:
+    departments: Dict[str, DepartmentRecord] = {}
+    for row in db.query(Department.id, Department.department_code, Department.name).order_by(Department.id):
+        departments[row.department_code] = DepartmentRecord(row.id, row.department_code, row.name)
+
+    roles: Dict[str, RoleRecord] = {}
+    for row in db.query(Role.id, Role.role_code, Role.name).order_by(Role.id):
+        roles[row.role_code] = RoleRecord(row.id, row.role_code, row.name)
+
+    competencies: Dict[str, CompetencyRecord] = {}
+    for row in db.query(
+        Competency.id, Competency.code, Competency.name, Competency.description, Competency.required_score
+    ).order_by(Competency.id):
+        competencies[row.code] = CompetencyRecord(
+            row.id, row.code, row.name, row.description, row.required_score
+        )
+
+    assignments: Dict[str, Dict[str, RoleCompetencyRecord]] = {}
+    for row in db.query(
+        RoleCompetency.role_code, RoleCompetency.competency_code, RoleCompetency.required_score
+    ).order_by(RoleCompetency.id):
+        assignments.setdefault(row.role_code, {}).setdefault(
+            row.competency_code, RoleCompetencyRecord(row.competency_code, row.required_score)
+        )
+
+    return ReferenceData(
+        departments,
+        {record.id: record for record in departments.values()},
+        roles,
+        {record.id: record for record in roles.values()},
+        competencies,
+        {record.id: record for record in competencies.values()},
+        {role_code: tuple(codes.values()) for role_code, codes in assignments.items()},
+        time.monotonic(),
+    )
+
+
+_current: Optional[ReferenceData] = None
+_lock = threading.Lock()
+
+
+def refresh(db: Optional[Session] = None) -> ReferenceData:
+    """Reload the reference data (with `db` if given, else a new session) and publish it."""
+    global _current
+    with _lock:
+        if db is not None:
+            _current = _load(db)
+        else:
+            with SessionLocal() as session:
+                _current = _load(session)
+        return _current
+
+
+def current() -> ReferenceData:
+    """The current snapshot, reloaded first if missing or older than REFDATA_TTL_SECONDS."""
+    data = _current
+    if data is None or time.monotonic() - data.loaded_at > REFDATA_TTL_SECONDS:
+        data = refresh()
+    return data
+
+
+def covering(
+    departments: Iterable[str] = (),
+    roles: Iterable[str] = (),
+    competencies: Iterable[str] = (),
+) -> ReferenceData:
+    """
+    The current snapshot, reloaded once if it lacks any of the given codes
+    (another process may have just created them). Codes still missing
+    afterwards do not exist.
+    """
+    data = current()
+    missing = (
+        any(code not in data.departments for code in departments)
+        or any(code not in data.roles for code in roles)
+        or any(code not in data.competencies for code in competencies)
+    )
+    if missing and time.monotonic() - data.loaded_at > REFDATA_MISS_RELOAD_SECONDS:
+        data = refresh()
+    return data
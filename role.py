@@ -1,12 +1,16 @@
 
-from typing import List
-from fastapi import Depends, HTTPException
+from typing import List, Optional
+from fastapi import Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
 from fastapi import APIRouter
 from auth import get_current_user
-from database import get_db
-from models import Competency, Role, RoleCompetency
+from database import SessionLocal, get_db
+from models import Role, RoleCompetency
 from schemas import RoleCreate, RoleResponse
+from cache import bump_data_version
+from jobs import JobQueue, QueueFullError
+import refdata
+import role_propagation
 
 
 router = APIRouter()
@@ -21,6 +25,7 @@ def create_role(role_data: RoleCreate, db: Session = Depends(get_db), current_us
     new_role = Role(role_code = role_data.role_code,name=role_data.name)
     db.add(new_role)
     db.commit()
+    refdata.refresh(db)
     db.refresh(new_role)
 
     return new_role
@@ -48,6 +53,7 @@ def update_role(role_id: int, role_data: RoleCreate, db: Session = Depends(get_d
     role.role_code = role_data.role_code
     role.name = role_data.name
     db.commit()
+    refdata.refresh(db)
     db.refresh(role)
 
     return role
@@ -59,6 +65,7 @@ def delete_role(role_id: int, db: Session = Depends(get_db), current_user: dict
 
     db.delete(role)
     db.commit()
+    refdata.refresh(db)
 
     return {"message": "Role deleted successfully"}
 
@@ -76,8 +83,7 @@ def get_role_competencies(
     role_code: str,
     db: Session = Depends(get_db)
 ):
-    role = db.query(Role).filter(Role.role_code == role_code).first()
-    if not role:
+    if refdata.covering(roles=[role_code]).role(role_code) is None:
         raise HTTPException(status_code=404, detail="Role not found")
     
     assignments = db.query(RoleCompetency.competency_code).filter(
@@ -91,13 +97,18 @@ def get_role_competencies(
 def assign_competencies_to_role(
     role_code: str,
     competency_codes: List[str],
+    response: Response,
+    propagate: bool = False,
     db: Session = Depends(get_db)
 ):
+    """
+    Assign competencies to a role. With propagate=true the new
+    competencies are also added, without a score, to the role's employees
+    who lack them; nothing is deleted.
+    """
     # 1. Verify role exists
-    role = db.query(Role).filter(
-        Role.role_code == role_code
-    ).first()
-    if not role:
+    references = refdata.covering(roles=[role_code], competencies=competency_codes)
+    if references.role(role_code) is None:
         raise HTTPException(status_code=404, detail="Role not found")
 
     # 2. Get existing assignments for this role
@@ -112,12 +123,7 @@ def assign_competencies_to_role(
         return []  # No new assignments needed
 
     # 4. Verify competencies exist and get their required scores
-    competencies = db.query(Competency.code, Competency.required_score).filter(
-        Competency.code.in_(new_codes)
-    ).all()
-    
-    existing_competency_codes = {c[0] for c in competencies}
-    missing = new_codes - existing_competency_codes
+    missing = {code for code in new_codes if references.competency(code) is None}
     if missing:
         raise HTTPException(
             status_code=404,
@@ -125,7 +131,7 @@ def assign_competencies_to_role(
         )
 
     # Create a dictionary of code to required_score
-    competency_scores = {c.code: c.required_score for c in competencies}
+    competency_scores = {code: references.competency(code).required_score for code in new_codes}
 
     # 5. Create new assignments with the correct required_score
     for code in new_codes:
@@ -135,8 +141,13 @@ def assign_competencies_to_role(
             required_score=competency_scores[code]
         )
         db.add(rc)
-    
-    db.commit()
+
+    if propagate:
+        db.flush()
+        _propagate(db, role_code, new_codes, response)
+    else:
+        db.commit()
+        refdata.refresh(db)
     return list(new_codes)
 
 
@@ -146,11 +157,17 @@ def assign_competencies_to_role(
 def remove_competencies_from_role(
     role_code: str,
     competency_codes: List[str],
+    response: Response,
+    propagate: bool = False,
     db: Session = Depends(get_db)
 ):
+    """
+    Remove competencies from a role. With propagate=true the role's
+    employees also lose their rows, and scores, for the removed
+    competencies. Only the listed codes are deleted.
+    """
     # Verify role exists
-    role = db.query(Role).filter(Role.role_code == role_code).first()
-    if not role:
+    if refdata.covering(roles=[role_code]).role(role_code) is None:
         raise HTTPException(status_code=404, detail="Role not found")
 
     # Delete specified assignments
@@ -158,8 +175,12 @@ def remove_competencies_from_role(
         RoleCompetency.role_code == role_code,
         RoleCompetency.competency_code.in_(competency_codes)
     ).delete(synchronize_session=False)
-    
-    db.commit()
+
+    if propagate and result:
+        _propagate(db, role_code, competency_codes, response)
+    else:
+        db.commit()
+        refdata.refresh(db)
     
     if result == 0:
         raise HTTPException(
@@ -167,4 +188,91 @@ def remove_competencies_from_role(
             detail="No matching competency assignments found"
         )
     
-    return competency_codes
\ No newline at end of file
+    return competency_codes
+
+
+
+# Propagation of role assignments to the employees in the role. Small roles
+# are updated in the request's transaction; larger ones are committed first
+# and propagated by a background job whose id is returned in the
+# X-Propagation-Job header.
+propagation_jobs = JobQueue("role-propagation", max_workers=1, max_pending=16)
+
+
+def _propagate(db: Session, role_code: str, competency_codes, response: Response) -> None:
+    if role_propagation.role_employee_count(db, role_code) <= role_propagation.ROLE_PROPAGATION_SYNC_LIMIT:
+        counts = role_propagation.sync_role_employees(db, role_code, competency_codes)
+        db.commit()
+        refdata.refresh(db)
+        bump_data_version()
+        response.headers["X-Propagated-Rows"] = str(counts["inserted"] + counts["deleted"])
+        return
+
+    db.commit()
+    refdata.refresh(db)
+    try:
+        job = propagation_jobs.submit(_run_propagation_job, role_code, list(competency_codes))
+    except QueueFullError as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
+    response.headers["X-Propagation-Job"] = job.id
+
+
+def _run_propagation_job(
+    job, role_code: str, competency_codes: Optional[List[str]], remove_unlisted: bool = True
+) -> dict:
+    """Propagate in batches of employees, one transaction per batch."""
+    with SessionLocal() as db:
+        job.update(
+            employees_total=role_propagation.role_employee_count(db, role_code),
+            employees_done=0, inserted=0, deleted=0
+        )
+        for first, last, count in role_propagation.role_employee_ranges(db, role_code):
+            counts = role_propagation.sync_role_employees(
+                db, role_code, competency_codes, (first, last), remove_unlisted
+            )
+            db.commit()
+            bump_data_version()
+            job.increment("employees_done", count)
+            job.increment("inserted", counts["inserted"])
+            job.increment("deleted", counts["deleted"])
+    progress = job.to_dict()["progress"]
+    return {"role_code": role_code, "inserted": progress["inserted"], "deleted": progress["deleted"]}
+
+
+@router.post("/roles/{role_code}/propagate", status_code=status.HTTP_202_ACCEPTED)
+def propagate_role_competencies(
+    role_code: str,
+    remove_unlisted: bool = False,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Reconcile every employee in the role with the role's current
+    competencies in the background: missing competencies are added
+    without a score and existing scores are kept.
+
+    With remove_unlisted=true, every employee competency the role does not
+    list is deleted together with its score. That includes competencies
+    that never came from the role, such as extra ones imported from a
+    workbook, so it is off by default.
+    """
+    if refdata.covering(roles=[role_code]).role(role_code) is None:
+        raise HTTPException(status_code=404, detail="Role not found")
+    try:
+        job = propagation_jobs.submit(_run_propagation_job, role_code, None, remove_unlisted)
+    except QueueFullError as e:
+        raise HTTPException(status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail=str(e))
+
+    return {
+        "job_id": job.id,
+        "status": job.status,
+        "status_url": f"/roles/propagation-jobs/{job.id}"
+    }
+
+
+@router.get("/roles/propagation-jobs/{job_id}")
+def get_propagation_job(job_id: str):
+    job = propagation_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Propagation job not found")
+    return job.to_dict()
@@ -0,0 +1,137 @@
+# role_propagation.py
+#
+# Applies role -> competency assignments to the employees holding the role.
+# Each change is one INSERT ... SELECT (competencies the role has and the
+# employee lacks) and one DELETE ... WHERE (competencies the employee has and
+# the role no longer lists), so the cost does not depend on how many
+# employees are in the role. Existing rows, and their actual scores, are
+# never rewritten.
+#
+# Rows do not record where they came from, so the DELETE cannot tell a
+# competency the role used to list from one imported with a workbook. It is
+# limited to the given competency codes, and a run over all codes only
+# deletes when asked to with remove_unlisted.
+import os
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, exists, func, insert, literal, select
+from sqlalchemy.orm import Session, aliased
+
+from models import Employee, EmployeeCompetency, RoleCompetency
+import gap_summary
+
+# Roles with more employees than this are propagated by a background job
+ROLE_PROPAGATION_SYNC_LIMIT = int(os.getenv("ROLE_PROPAGATION_SYNC_LIMIT", "2000"))
+# Employees per transaction when a job propagates a large role
+ROLE_PROPAGATION_BATCH_SIZE = int(os.getenv("ROLE_PROPAGATION_BATCH_SIZE", "1000"))
+
+
+def role_employee_count(db: Session, role_code: str) -> int:
+    return db.scalar(select(func.count()).select_from(Employee).where(Employee.role_code == role_code))
+
+
+def _employee_filter(role_code: str, employee_range: Optional[Tuple[str, str]]) -> list:
+    filters = [Employee.role_code == role_code]
+    if employee_range is not None:
+        filters.append(Employee.employee_number.between(*employee_range))
+    return filters
+
+
+def sync_role_employees(
+    db: Session,
+    role_code: str,
+    competency_codes: Optional[Iterable[str]] = None,
+    employee_range: Optional[Tuple[str, str]] = None,
+    remove_unlisted: bool = True,
+) -> Dict[str, int]:
+    """
+    Bring the competency rows of the role's employees in line with the
+    role's assignments, limited to `competency_codes` if given and to
+    employee numbers within `employee_range` (inclusive) if given. Rows
+    for competencies the role does not list are deleted, within
+    `competency_codes` when given, unless `remove_unlisted` is false.
+    Keeps the analytics summaries in step. Does not commit.
+    """
+    codes = list(competency_codes) if competency_codes is not None else None
+    employee_filter = _employee_filter(role_code, employee_range)
+
+    # Missing rows: one per (employee, role competency), without a score yet.
+    # A competency assigned to the role twice takes the required score of
+    # its first assignment, as in refdata and employee creation.
+    earlier = aliased(RoleCompetency)
+    assignments = select(
+        Employee.employee_number,
+        RoleCompetency.competency_code,
+        RoleCompetency.required_score,
+        literal(None),
+    ).join(
+        RoleCompetency, RoleCompetency.role_code == Employee.role_code
+    ).where(
+        *employee_filter,
+        ~exists().where(
+            earlier.role_code == RoleCompetency.role_code,
+            earlier.competency_code == RoleCompetency.competency_code,
+            earlier.id < RoleCompetency.id,
+        ),
+        ~exists().where(
+            EmployeeCompetency.employee_number == Employee.employee_number,
+            EmployeeCompetency.competency_code == RoleCompetency.competency_code,
+        ),
+    )
+    if codes is not None:
+        assignments = assignments.where(RoleCompetency.competency_code.in_(codes))
+
+    inserted = db.execute(
+        insert(EmployeeCompetency).from_select(
+            ["employee_number", "competency_code", "required_score", "actual_score"], assignments
+        )
+    ).rowcount
+
+    if not remove_unlisted:
+        return {"inserted": inserted, "deleted": 0}
+
+    # Stale rows: competencies the role no longer lists
+    stale = [
+        EmployeeCompetency.employee_number.in_(select(Employee.employee_number).where(*employee_filter)),
+        ~exists().where(
+            RoleCompetency.role_code == role_code,
+            RoleCompetency.competency_code == EmployeeCompetency.competency_code,
+        ),
+    ]
+    if codes is not None:
+        stale.append(EmployeeCompetency.competency_code.in_(codes))
+
+    removed_gaps = db.query(
+        Employee.department_code, EmployeeCompetency.competency_code, *gap_summary.gap_bucket_columns()
+    ).join(
+        Employee, Employee.employee_number == EmployeeCompetency.employee_number
+    ).filter(*stale).group_by(Employee.department_code, EmployeeCompetency.competency_code).all()
+
+    deleted = db.execute(
+        delete(EmployeeCompetency).where(*stale).execution_options(synchronize_session=False)
+    ).rowcount
+
+    gap_summary.apply_gap_delta(db, {
+        (row.department_code, row.competency_code): [-int(row.gap1 or 0), -int(row.gap2 or 0), -int(row.gap3 or 0)]
+        for row in removed_gaps
+    })
+
+    return {"inserted": inserted, "deleted": deleted}
+
+
+def role_employee_ranges(db: Session, role_code: str, batch_size: int = None) -> Iterable[Tuple[str, str, int]]:
+    """
+    (first, last, count) employee numbers of consecutive batches of the
+    role's employees, found by keyset over the primary key.
+    """
+    batch_size = batch_size or ROLE_PROPAGATION_BATCH_SIZE
+    last = None
+    while True:
+        query = select(Employee.employee_number).where(Employee.role_code == role_code)
+        if last is not None:
+            query = query.where(Employee.employee_number > last)
+        numbers: List[str] = db.scalars(query.order_by(Employee.employee_number).limit(batch_size)).all()
+        if not numbers:
+            return
+        last = numbers[-1]
+        yield numbers[0], last, len(numbers)
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from typing import List, Optional
 from datetime import date
 
@@ -88,6 +88,23 @@ class EmployeeCompetencyResponse(BaseModel):
 
 
 
+class EvaluationScore(BaseModel):
+    competency_code: str
+    actual_score: int
+
+class EmployeeEvaluation(BaseModel):
+    employee_number: str
+    scores: List[EvaluationScore]
+
+class BatchEvaluationRequest(BaseModel):
+    evaluations: List[EmployeeEvaluation]
+    # Employees per transaction; None commits the whole batch at once
+    chunk_size: Optional[int] = Field(None, ge=1)
+    # Review cycle label for the history; derived from the date when omitted
+    cycle: Optional[str] = None
+
+
+
 class EmployeeCreateRequest(BaseModel):
     employee_number: str
     employee_name: str
@@ -111,6 +128,16 @@ class EmployeeResponse(BaseModel):
 
 
 
+class CompetencyChanges(BaseModel):
+    inserted: int
+    deleted: int
+    updated: int
+
+class EmployeeUpdateResponse(EmployeeResponse):
+    competency_changes: CompetencyChanges
+
+
+
 class EmployeeEvaluationStatusUpdate(BaseModel):
     status: bool
     evaluated_by: Optional[str] = None
@@ -1,3 +1,10 @@
+import asyncio
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Tuple
+
 from passlib.context import CryptContext
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
@@ -8,7 +15,25 @@ SECRET_KEY = "your_secret_key"
 
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt cost factor for new hashes. Existing hashes with a different cost
+# are re-hashed transparently on the next successful login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+# bcrypt runs on its own small pool so a login burst cannot occupy the
+# request threadpool. At most PASSWORD_HASH_WORKERS hashes run at once and
+# PASSWORD_HASH_MAX_QUEUE more may wait; beyond that callers are turned away.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", "32"))
+
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_slots = threading.BoundedSemaphore(PASSWORD_HASH_WORKERS + PASSWORD_HASH_MAX_QUEUE)
+
+
+class PasswordHashingBusyError(Exception):
+    pass
+
 
 def get_password_hash(password: str):
     return pwd_context.hash(password)
@@ -16,9 +41,32 @@ def get_password_hash(password: str):
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
+
+async def _run_on_hash_pool(fn, *args):
+    if not _hash_slots.acquire(blocking=False):
+        raise PasswordHashingBusyError("Too many password operations in progress, try again later")
+    future = _hash_executor.submit(fn, *args)
+    # The slot is held until the hash finishes, even if the request goes away
+    future.add_done_callback(lambda _: _hash_slots.release())
+    return await asyncio.wrap_future(future)
+
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_on_hash_pool(pwd_context.hash, password)
+
+
+async def verify_and_update_password_async(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """
+    Verify on the hash pool. The second item is a replacement hash when the
+    stored one was made with a different cost factor, otherwise None.
+    """
+    return await _run_on_hash_pool(pwd_context.verify_and_update, plain_password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: timedelta):
     to_encode = data.copy()
     expire = datetime.utcnow() + expires_delta
-    to_encode.update({"exp": expire})
+    to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
@@ -0,0 +1,183 @@
+# snapshots.py
+#
+# Columnar Parquet snapshots of the assessment tables for the BI team.
+# Each table is split into chunks; a chunk is rewritten only when its
+# content digest differs from the one recorded in the previous manifest,
+# so repeated snapshots cost one read of the tables plus the changed chunks.
+#
+# Layout under SNAPSHOT_DIR:
+#   manifest.json                          latest snapshot (tables, chunks, row counts)
+#   <table>/<table>-<chunk>-<digest>.parquet
+import hashlib
+import json
+import os
+import sys
+import zlib
+from datetime import datetime
+from typing import Dict, List, Optional
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from sqlalchemy import Boolean, Date, Integer, select
+from sqlalchemy.orm import Session
+
+from models import Competency, Employee, EmployeeCompetency, RoleCompetency
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+SNAPSHOT_COMPRESSION = os.getenv("SNAPSHOT_COMPRESSION", "zstd")
+# Rows per id-range chunk for tables with an integer primary key
+SNAPSHOT_CHUNK_ROWS = int(os.getenv("SNAPSHOT_CHUNK_ROWS", "100000"))
+# Hash buckets for the employees table, whose primary key is a string
+SNAPSHOT_EMPLOYEE_BUCKETS = int(os.getenv("SNAPSHOT_EMPLOYEE_BUCKETS", "16"))
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+# Table name -> model. Integer-keyed tables are chunked by id range,
+# employees by a stable hash of employee_number.
+SNAPSHOT_TABLES = {
+    "employees": Employee,
+    "employee_competencies": EmployeeCompetency,
+    "role_competencies": RoleCompetency,
+    "competencies": Competency,
+}
+
+
+def _arrow_type(column) -> pa.DataType:
+    if isinstance(column.type, Boolean):
+        return pa.bool_()
+    if isinstance(column.type, Integer):
+        return pa.int64()
+    if isinstance(column.type, Date):
+        return pa.date32()
+    return pa.string()
+
+
+def _arrow_schema(model) -> pa.Schema:
+    return pa.schema([(column.name, _arrow_type(column)) for column in model.__table__.columns])
+
+
+def _digest(rows: List[tuple]) -> str:
+    return hashlib.sha1(json.dumps(rows, default=str).encode()).hexdigest()
+
+
+def _employee_bucket(employee_number: str) -> int:
+    return zlib.crc32(employee_number.encode()) % SNAPSHOT_EMPLOYEE_BUCKETS
+
+
+def _table_chunks(db: Session, model):
+    """Yield (chunk number, rows) for every non-empty chunk of `model`'s table."""
+    columns = list(model.__table__.columns)
+
+    if model is Employee:
+        # Employees are small next to their scores; bucket them in one pass
+        buckets: Dict[int, List[tuple]] = {}
+        for row in db.execute(select(*columns).order_by(Employee.employee_number)):
+            buckets.setdefault(_employee_bucket(row.employee_number), []).append(tuple(row))
+        yield from sorted(buckets.items())
+        return
+
+    pk = model.__table__.c.id
+    max_id = db.scalar(select(pk).order_by(pk.desc()).limit(1))
+    if max_id is None:
+        return
+    for chunk in range(max_id // SNAPSHOT_CHUNK_ROWS + 1):
+        low = chunk * SNAPSHOT_CHUNK_ROWS
+        rows = db.execute(
+            select(*columns).where(pk >= low, pk < low + SNAPSHOT_CHUNK_ROWS).order_by(pk)
+        ).all()
+        if rows:
+            yield chunk, [tuple(row) for row in rows]
+
+
+def _write_chunk(path: str, schema: pa.Schema, rows: List[tuple]) -> None:
+    arrays = [pa.array([row[i] for row in rows], type=field.type) for i, field in enumerate(schema)]
+    tmp_path = path + ".tmp"
+    pq.write_table(pa.Table.from_arrays(arrays, schema=schema), tmp_path, compression=SNAPSHOT_COMPRESSION)
+    os.replace(tmp_path, path)
+
+
+def load_manifest(snapshot_dir: str = None) -> Optional[dict]:
+    path = os.path.join(snapshot_dir or SNAPSHOT_DIR, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def create_snapshot(db: Session, snapshot_dir: str = None, on_table=None) -> dict:
+    """
+    Write a snapshot of SNAPSHOT_TABLES and return its manifest. Chunks whose
+    digest matches the previous manifest are kept as they are; files no
+    longer referenced are removed once the new manifest is in place.
+    `on_table(name, manifest_entry)` is called after each table.
+    """
+    snapshot_dir = snapshot_dir or SNAPSHOT_DIR
+    previous = load_manifest(snapshot_dir) or {}
+    if previous.get("version") != MANIFEST_VERSION or previous.get("chunkRows") != SNAPSHOT_CHUNK_ROWS \
+            or previous.get("employeeBuckets") != SNAPSHOT_EMPLOYEE_BUCKETS:
+        previous = {}
+
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "createdAt": datetime.utcnow().isoformat(),
+        "compression": SNAPSHOT_COMPRESSION,
+        "chunkRows": SNAPSHOT_CHUNK_ROWS,
+        "employeeBuckets": SNAPSHOT_EMPLOYEE_BUCKETS,
+        "tables": {},
+        "chunksWritten": 0,
+        "chunksReused": 0,
+    }
+
+    for name, model in SNAPSHOT_TABLES.items():
+        os.makedirs(os.path.join(snapshot_dir, name), exist_ok=True)
+        schema = _arrow_schema(model)
+        known = {
+            chunk["digest"]: chunk["file"]
+            for chunk in previous.get("tables", {}).get(name, {}).get("chunks", [])
+        }
+        chunks = []
+        for number, rows in _table_chunks(db, model):
+            digest = _digest(rows)
+            file_name = known.get(digest)
+            if file_name and os.path.exists(os.path.join(snapshot_dir, file_name)):
+                manifest["chunksReused"] += 1
+            else:
+                file_name = f"{name}/{name}-{number:05d}-{digest[:16]}.parquet"
+                _write_chunk(os.path.join(snapshot_dir, file_name), schema, rows)
+                manifest["chunksWritten"] += 1
+            chunks.append({"chunk": number, "file": file_name, "rows": len(rows), "digest": digest})
+
+        manifest["tables"][name] = {
+            "rows": sum(chunk["rows"] for chunk in chunks),
+            "columns": schema.names,
+            "chunks": chunks,
+        }
+        if on_table is not None:
+            on_table(name, manifest["tables"][name])
+
+    manifest_path = os.path.join(snapshot_dir, MANIFEST_NAME)
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+    _remove_unreferenced(snapshot_dir, manifest)
+    return manifest
+
+
+def _remove_unreferenced(snapshot_dir: str, manifest: dict) -> None:
+    referenced = {chunk["file"] for table in manifest["tables"].values() for chunk in table["chunks"]}
+    for name in SNAPSHOT_TABLES:
+        for file_name in os.listdir(os.path.join(snapshot_dir, name)):
+            if f"{name}/{file_name}" not in referenced:
+                os.remove(os.path.join(snapshot_dir, name, file_name))
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    with SessionLocal() as db:
+        result = create_snapshot(db, sys.argv[1] if len(sys.argv) > 1 else None)
+    for name, table in result["tables"].items():
+        print(f"{name}: {table['rows']} rows in {len(table['chunks'])} chunks")
+    print(f"chunks written {result['chunksWritten']}, reused {result['chunksReused']}")
@@ -1,18 +1,91 @@
 # analytics.py
-from fastapi import APIRouter, Depends, HTTPException
+import hashlib
+import os
+from datetime import date
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import and_, or_
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Literal, Optional
 from auth import get_current_user
-from database import get_db
+from database import get_async_db, get_db
 from models import Department, Employee, EmployeeCompetency, Competency, RoleCompetency
+from cache import TTLCache, bump_data_version, data_version
+import evaluation_history
+import gap_analysis
+import gap_summary
+import refdata
+from pagination import decode_cursor, encode_cursor
 
 router = APIRouter(
     prefix="/analytics",
     tags=["analytics"],
 )
 
+# Rendered analytics responses keyed by (endpoint, args, data version). Writes
+# bump the data version, so entries are only reused while the data is unchanged.
+analytics_cache = TTLCache(
+    maxsize=int(os.getenv("ANALYTICS_CACHE_SIZE", "256")),
+    ttl=float(os.getenv("ANALYTICS_CACHE_TTL", "30")),
+)
+
+
+def _etag_matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+async def _cached_json(request: Request, key: tuple, db: AsyncSession, build) -> Response:
+    """
+    Serve `build(session)` as JSON through the analytics cache. `build` is a
+    synchronous aggregation run on the async session's connection via
+    run_sync. The ETag is a hash of the rendered body, so a matching
+    If-None-Match on a cache hit returns 304 without building or
+    serializing the payload.
+    """
+    cache_key = key + (data_version(),)
+    cached = analytics_cache.get(cache_key)
+    if cached is None:
+        payload = await db.run_sync(build)
+        body = JSONResponse(content=jsonable_encoder(payload)).body
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        cached = (body, etag)
+        analytics_cache.set(cache_key, cached)
+
+    body, etag = cached
+    # Responses depend on the caller's department scope
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Authorization"}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def _department_scope(current_user: dict, department_code: Optional[str]) -> Optional[str]:
+    """HODs are always limited to their own department; HR may pick one or see all."""
+    if current_user["role"] != "HR":
+        return current_user["department_code"]
+    return department_code
+
+
+def _gap_data(row) -> Dict[str, int]:
+    if row is None:
+        return {"gap1": 0, "gap2": 0, "gap3": 0}
+    return {"gap1": int(row.gap1 or 0), "gap2": int(row.gap2 or 0), "gap3": int(row.gap3 or 0)}
+
+
 @router.get("/dashboard")
-def get_analytics_dashboard(db: Session = Depends(get_db)):
+async def get_analytics_dashboard(
+    request: Request,
+    department_code: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(get_current_user)
+):
     """
     Get overall analytics data for the dashboard including:
     - Total employees
@@ -21,104 +94,58 @@ def get_analytics_dashboard(db: Session = Depends(get_db)):
     - Department-wise employee counts
     - Department-wise competency gaps
     - Competency-wise gap distribution
+
+    Counts are read from the pre-aggregated summary tables maintained by
+    the employee and evaluation write paths (see gap_summary.py), with a
+    fixed number of queries independent of the number of employees.
+
+    HODs get their department only; HR can narrow it with department_code.
     """
-    # Get total employees count
-    total_employees = db.query(Employee).count()
-    
-    # Get evaluation status counts
-    evaluated_count = db.query(Employee).filter(Employee.evaluation_status == True).count()
+    scope = _department_scope(current_user, department_code)
+    return await _cached_json(
+        request, ("dashboard", scope), db, lambda session: _build_dashboard(session, scope)
+    )
+
+
+def _build_dashboard(db: Session, department_code: Optional[str] = None) -> Dict[str, Any]:
+    # Get total and evaluated employee counts
+    total_employees, evaluated_count = gap_summary.summary_totals(db, department_code)
     not_evaluated_count = total_employees - evaluated_count
-    
+
+    dept_counts = gap_summary.summary_department_counts(db, department_code)
+    dept_gaps = gap_summary.summary_department_gaps(db, department_code)
+
     # Get department data
-    departments = db.query(Department).all()
+    references = refdata.current()
+    departments = references.departments.values()
+    if department_code is not None:
+        departments = [dept for dept in departments if dept.code == department_code]
     department_data = []
-    
     for dept in departments:
-        # Get employees in this department
-        dept_employees = db.query(Employee).filter(Employee.department_code == dept.department_code).all()
-        dept_employee_count = len(dept_employees)
-        
-        # Get employee numbers for competency gap calculation
-        employee_numbers = [emp.employee_number for emp in dept_employees]
-        
-        # Initialize gap counters
-        gap1_count = 0
-        gap2_count = 0
-        gap3_count = 0
-        
-        # Get competency gaps for employees in this department
-        if employee_numbers:
-            employee_competencies = db.query(EmployeeCompetency).filter(
-                EmployeeCompetency.employee_number.in_(employee_numbers)
-            ).all()
-            
-            for ec in employee_competencies:
-                    if ec.required_score is not None and ec.actual_score is not None:
-                        gap = ec.required_score - ec.actual_score
-                        if gap == 1:
-                            gap1_count += 1
-                        elif gap == 2:
-                            gap2_count += 1
-                        elif gap == 3:
-                            gap3_count += 1
-
-        
-        # Get evaluation status counts for this department
-        dept_evaluated = db.query(Employee).filter(
-            Employee.department_code == dept.department_code,
-            Employee.evaluation_status == True
-        ).count()
-        
-        dept_not_evaluated = dept_employee_count - dept_evaluated
-        
+        counts = dept_counts.get(dept.code)
+        dept_employee_count = counts.employee_count if counts else 0
+        dept_evaluated = int(counts.evaluated_count or 0) if counts else 0
+
         department_data.append({
-            "departmentCode": dept.department_code,
+            "departmentCode": dept.code,
             "departmentName": dept.name,
             "employeeCount": dept_employee_count,
-            "gapData": {
-                "gap1": gap1_count,
-                "gap2": gap2_count,
-                "gap3": gap3_count
-            },
+            "gapData": _gap_data(dept_gaps.get(dept.code)),
             "evaluatedCount": dept_evaluated,
-            "notEvaluatedCount": dept_not_evaluated
+            "notEvaluatedCount": dept_employee_count - dept_evaluated
         })
-    
+
     # Get competency data
-    competencies = db.query(Competency).all()
-    competency_data = []
-    
-    for comp in competencies:
-        # Get competency gaps by competency
-        employee_comp_records = db.query(EmployeeCompetency).filter(
-            EmployeeCompetency.competency_code == comp.code
-        ).all()
-        
-        gap1_count = 0
-        gap2_count = 0
-        gap3_count = 0
-        
-        for ec in employee_comp_records:
-            if ec.required_score is not None and ec.actual_score is not None:
-                gap = ec.required_score - ec.actual_score
-                if gap == 1:
-                    gap1_count += 1
-                elif gap == 2:
-                    gap2_count += 1
-                elif gap == 3:
-                    gap3_count += 1
-
-        
-        competency_data.append({
+    comp_gaps = gap_summary.summary_competency_gaps(db, department_code)
+    competency_data = [
+        {
             "competencyCode": comp.code,
             "competencyName": comp.name,
-            "gapData": {
-                "gap1": gap1_count,
-                "gap2": gap2_count,
-                "gap3": gap3_count
-            }
-        })
-    
+            "gapData": _gap_data(comp_gaps.get(comp.code))
+        }
+        for comp in references.competencies.values()
+    ]
+
     # Compile all data
     return {
         "totalEmployees": total_employees,
@@ -135,37 +162,31 @@ from models import Competency, EmployeeCompetency
 
 
 @router.get("/by-competency")
-def get_competency_gap_data(db: Session = Depends(get_db)):
-    competencies = db.query(Competency).all()
-    result = []
+async def get_competency_gap_data(
+    request: Request,
+    department_code: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(get_current_user)
+):
+    scope = _department_scope(current_user, department_code)
+    return await _cached_json(
+        request, ("by-competency", scope), db, lambda session: _build_competency_gap_data(session, scope)
+    )
 
-    for comp in competencies:
-        gap1 = 0
-        gap2 = 0
-        gap3 = 0
-
-        # Get all employee competencies for this competency
-        records = db.query(EmployeeCompetency).filter(
-            EmployeeCompetency.competency_code == comp.code
-        ).all()
-
-        for record in records:
-            if record.required_score is not None and record.actual_score is not None:
-                gap = record.required_score - record.actual_score
-                if gap == 1:
-                    gap1 += 1
-                elif gap == 2:
-                    gap2 += 1
-                elif gap == 3:
-                    gap3 += 1
 
+def _build_competency_gap_data(db: Session, department_code: Optional[str] = None) -> List[Dict[str, Any]]:
+    comp_gaps = gap_summary.summary_competency_gaps(db, department_code)
+    result = []
+
+    for comp in refdata.current().competencies.values():
+        gaps = _gap_data(comp_gaps.get(comp.code))
         result.append({
             "competencyCode": comp.code,
             "competencyName": comp.name,
-            "gap1": gap1,
-            "gap2": gap2,
-            "gap3": gap3,
-            "totalGapEmployees": gap1 + gap2 + gap3
+            "gap1": gaps["gap1"],
+            "gap2": gaps["gap2"],
+            "gap3": gaps["gap3"],
+            "totalGapEmployees": gaps["gap1"] + gaps["gap2"] + gaps["gap3"]
         })
 
     return result
@@ -174,29 +195,239 @@ def get_competency_gap_data(db: Session = Depends(get_db)):
 
 
 @router.get("/details/by-competency/{compcode}")
-def get_employee_gaps_by_competency(
+async def get_employee_gaps_by_competency(
     compcode: str,
-    db: Session = Depends(get_db)
-    # ,current_user: dict = Depends(get_current_user)
+    request: Request,
+    department_code: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(get_current_user)
 ):
-    records = db.query(EmployeeCompetency).filter(
-        EmployeeCompetency.competency_code == compcode
-    ).all()
+    scope = _department_scope(current_user, department_code)
+    return await _cached_json(
+        request,
+        ("details/by-competency", compcode, scope),
+        db,
+        lambda session: _build_employee_gaps_by_competency(session, compcode, scope)
+    )
 
-    result = []
 
-    for rec in records:
-        if rec.required_score is not None and rec.actual_score is not None:
-            gap = rec.required_score - rec.actual_score
-            if gap > 0:
-                result.append({
-                    "employeeNumber": rec.employee_number,
-                    "requiredScore": rec.required_score,
-                    "actualScore": rec.actual_score,
-                    "gap": gap
-                })
+def _build_employee_gaps_by_competency(
+    db: Session, compcode: str, department_code: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    return [
+        {
+            "employeeNumber": row["employeeNumber"],
+            "requiredScore": row["requiredScore"],
+            "actualScore": row["actualScore"],
+            "gap": row["gap"]
+        }
+        for row in gap_analysis.worst_gaps(db, competency_code=compcode, department_code=department_code)
+    ]
 
-    # Sort by descending gap
-    result.sort(key=lambda x: x["gap"], reverse=True)
 
-    return result
+@router.get("/gap-statistics")
+async def get_gap_statistics(
+    request: Request,
+    by: Literal["department", "competency"] = "department",
+    top: int = Query(20, ge=0, le=1000),
+    department_code: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Gap distribution per department or competency: gap 1/2/3 counts, the
+    number of scored rows, the mean gap (scores above the requirement give
+    negative gaps), the mean shortfall and shortfall percentiles (gaps
+    below zero count as zero), plus the `top` largest individual gaps.
+    Scoped to a department like the other analytics endpoints. Rows are
+    counted per department, competency and gap in SQL, so only the
+    distinct groups and the `top` rows are read.
+    """
+    scope = _department_scope(current_user, department_code)
+    return await _cached_json(
+        request,
+        ("gap-statistics", by, top, scope),
+        db,
+        lambda session: _build_gap_statistics(session, by, top, scope)
+    )
+
+
+def _build_gap_statistics(db: Session, by: str, top: int, department_code: Optional[str] = None) -> Dict[str, Any]:
+    frame = gap_analysis.load_gap_frame(db, department_code=department_code)
+    return {
+        "groupBy": by,
+        "scoredCount": frame.scored_total,
+        "groups": gap_analysis.gap_statistics(frame, by),
+        "worstGaps": gap_analysis.worst_gaps(db, top, department_code=department_code) if top else []
+    }
+
+
+
+@router.get("/leaderboard")
+async def get_gap_leaderboard(
+    request: Request,
+    competency_code: Optional[str] = None,
+    department_code: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=500),
+    cursor: Optional[str] = None,
+    include_names: bool = True,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Largest competency gaps first, for one competency, one department or
+    the whole company. Gaps are computed, filtered, ordered and limited in
+    the database, so only `limit` rows are read. Pass `nextCursor` back as
+    `cursor` for the following page.
+    """
+    scope = _department_scope(current_user, department_code)
+    after = decode_cursor(cursor, 3) if cursor is not None else None
+    return await _cached_json(
+        request,
+        ("leaderboard", competency_code, scope, limit, cursor, include_names),
+        db,
+        lambda session: _build_gap_leaderboard(session, competency_code, scope, limit, after, include_names)
+    )
+
+
+def _build_gap_leaderboard(
+    db: Session,
+    competency_code: Optional[str],
+    department_code: Optional[str],
+    limit: int,
+    after: Optional[list],
+    include_names: bool
+) -> Dict[str, Any]:
+    gap = (EmployeeCompetency.required_score - EmployeeCompetency.actual_score).label("gap")
+    columns = [
+        EmployeeCompetency.employee_number,
+        EmployeeCompetency.competency_code,
+        EmployeeCompetency.required_score,
+        EmployeeCompetency.actual_score,
+        gap,
+    ]
+    if include_names:
+        columns += [Employee.employee_name, Employee.department_code, Department.name.label("department_name")]
+
+    # Rows with a missing score have a NULL gap and fail the filter
+    query = db.query(*columns).filter(gap > 0)
+    if include_names or department_code is not None:
+        query = query.join(Employee, Employee.employee_number == EmployeeCompetency.employee_number)
+    if include_names:
+        query = query.outerjoin(Department, Department.department_code == Employee.department_code)
+    if competency_code is not None:
+        query = query.filter(EmployeeCompetency.competency_code == competency_code)
+    if department_code is not None:
+        query = query.filter(Employee.department_code == department_code)
+    if after is not None:
+        after_gap, after_employee, after_competency = after
+        query = query.filter(or_(
+            gap < after_gap,
+            and_(gap == after_gap, EmployeeCompetency.employee_number > after_employee),
+            and_(
+                gap == after_gap,
+                EmployeeCompetency.employee_number == after_employee,
+                EmployeeCompetency.competency_code > after_competency
+            )
+        ))
+
+    rows = query.order_by(
+        gap.desc(), EmployeeCompetency.employee_number, EmployeeCompetency.competency_code
+    ).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([last.gap, last.employee_number, last.competency_code])
+
+    items = []
+    for row in rows:
+        item = {
+            "employeeNumber": row.employee_number,
+            "competencyCode": row.competency_code,
+            "requiredScore": row.required_score,
+            "actualScore": row.actual_score,
+            "gap": row.gap
+        }
+        if include_names:
+            item.update({
+                "employeeName": row.employee_name,
+                "departmentCode": row.department_code,
+                "departmentName": row.department_name
+            })
+        items.append(item)
+
+    return {"items": items, "nextCursor": next_cursor}
+
+
+
+@router.get("/trends")
+async def get_gap_trends(
+    request: Request,
+    by: Literal["department", "competency"] = "department",
+    department_code: Optional[str] = None,
+    competency_code: Optional[str] = None,
+    from_date: Optional[date] = None,
+    to_date: Optional[date] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Gap evolution across review cycles per department or competency, read
+    from the evaluation history. `from_date`/`to_date` (inclusive) limit
+    the evaluations considered, so only that time range is scanned.
+    """
+    scope = _department_scope(current_user, department_code)
+    return await _cached_json(
+        request,
+        ("trends", by, scope, competency_code, from_date, to_date),
+        db,
+        lambda session: {
+            "groupBy": by,
+            "cycles": evaluation_history.gap_trends(session, by, scope, competency_code, from_date, to_date)
+        }
+    )
+
+
+
+def _require_hr(current_user: dict) -> None:
+    if current_user["role"] != "HR":
+        raise HTTPException(status_code=403, detail="Only HR can manage analytics")
+
+
+@router.post("/summary/rebuild")
+def rebuild_gap_summary(
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Recompute the analytics summary tables from the base tables."""
+    _require_hr(current_user)
+    drift_before = gap_summary.drift(db)
+    counts = gap_summary.rebuild(db)
+    db.commit()
+    bump_data_version()
+    return {
+        "message": "Analytics summaries rebuilt",
+        "departments": counts["departments"],
+        "gapRows": counts["gap_rows"],
+        "driftCorrected": len(drift_before)
+    }
+
+
+@router.get("/summary/drift")
+def get_gap_summary_drift(
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """Compare the analytics summary tables against a live aggregation."""
+    _require_hr(current_user)
+    mismatches = gap_summary.drift(db)
+    return {"inSync": not mismatches, "mismatches": mismatches}
+
+
+@router.get("/cache/stats")
+def get_analytics_cache_stats(current_user: dict = Depends(get_current_user)):
+    """Hit/miss counters and occupancy of the analytics response cache. HR only."""
+    _require_hr(current_user)
+    return {**analytics_cache.stats(), "dataVersion": data_version()}
@@ -0,0 +1,140 @@
+# tests/test_employee_renumber.py
+#
+# Renumbering and deleting an employee through the router functions, against
+# a SQLite database with foreign key enforcement turned on.
+import os
+import sys
+
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from database import Base, create_db_engine  # noqa: E402
+from models import (  # noqa: E402
+    Competency,
+    Department,
+    Employee,
+    EmployeeCompetency,
+    EvaluationHistory,
+    Role,
+    RoleCompetency,
+)
+from schemas import EmployeeCreateRequest  # noqa: E402
+import employee  # noqa: E402
+import evaluation_history  # noqa: E402
+import gap_summary  # noqa: E402
+import refdata  # noqa: E402
+
+HR_USER = {"username": "hr", "role": "HR", "department_code": "HR"}
+
+
+def _enable_foreign_keys(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'renumber.db'}")
+    event.listen(engine, "connect", _enable_foreign_keys)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+
+    session.add_all([
+        Department(department_code="IT", name="IT"),
+        Role(role_code="R1", name="Role 1"),
+        Role(role_code="R2", name="Role 2"),
+        Competency(code="C1", name="C1", required_score=3),
+        Competency(code="C2", name="C2", required_score=4),
+        Competency(code="C3", name="C3", required_score=2),
+    ])
+    session.flush()
+    session.add_all([
+        RoleCompetency(role_code="R1", competency_code="C1", required_score=3),
+        RoleCompetency(role_code="R1", competency_code="C2", required_score=4),
+        RoleCompetency(role_code="R2", competency_code="C2", required_score=4),
+        RoleCompetency(role_code="R2", competency_code="C3", required_score=2),
+        Employee(
+            employee_number="E1", employee_name="Ann", job_code="J1", reporting_employee_name="Boss",
+            role_code="R1", department_code="IT", evaluation_status=True, evaluation_by="hr"
+        ),
+    ])
+    session.flush()
+    session.add_all([
+        EmployeeCompetency(employee_number="E1", competency_code="C1", required_score=3, actual_score=1),
+        EmployeeCompetency(employee_number="E1", competency_code="C2", required_score=4, actual_score=2),
+    ])
+    evaluation_history.record_evaluations(session, [
+        {"employee_number": "E1", "department_code": "IT", "competency_code": "C1",
+         "required_score": 3, "actual_score": 1},
+    ], "hr")
+    gap_summary.rebuild(session)
+    session.commit()
+    refdata.refresh(session)
+
+    yield session
+
+    session.close()
+    engine.dispose()
+    refdata._current = None
+
+
+def _request(**overrides) -> EmployeeCreateRequest:
+    values = {
+        "employee_number": "E2",
+        "employee_name": "Ann",
+        "job_code": "J1",
+        "reporting_employee_name": "Boss",
+        "role_code": "R1",
+        "department_code": "IT",
+    }
+    values.update(overrides)
+    return EmployeeCreateRequest(**values)
+
+
+def _scores(db, employee_number):
+    return {
+        row.competency_code: row.actual_score
+        for row in db.query(EmployeeCompetency).filter(EmployeeCompetency.employee_number == employee_number)
+    }
+
+
+def test_foreign_keys_are_enforced(db):
+    assert db.connection().exec_driver_sql("PRAGMA foreign_keys").scalar() == 1
+
+
+def test_renumber_moves_competencies(db):
+    result = employee.update_employee("E1", _request(), db=db, current_user=HR_USER)
+
+    assert result["employee_number"] == "E2"
+    assert result["evaluation_status"] is True
+    assert result["competency_changes"] == {"inserted": 0, "deleted": 0, "updated": 2}
+    assert db.query(Employee).filter(Employee.employee_number == "E1").first() is None
+    assert _scores(db, "E1") == {}
+    assert _scores(db, "E2") == {"C1": 1, "C2": 2}
+    assert gap_summary.drift(db) == []
+
+
+def test_renumber_with_role_change(db):
+    result = employee.update_employee("E1", _request(role_code="R2"), db=db, current_user=HR_USER)
+
+    assert result["competency_changes"] == {"inserted": 1, "deleted": 1, "updated": 2}
+    assert _scores(db, "E2") == {"C2": 2, "C3": None}
+    assert gap_summary.drift(db) == []
+
+
+def test_renumber_moves_evaluation_history(db):
+    employee.update_employee("E1", _request(), db=db, current_user=HR_USER)
+
+    numbers = [row.employee_number for row in db.query(EvaluationHistory)]
+    assert numbers == ["E2"]
+
+
+def test_delete_keeps_evaluation_history(db):
+    employee.delete_employee("E1", db=db)
+
+    assert db.query(Employee).count() == 0
+    assert [row.employee_number for row in db.query(EvaluationHistory)] == ["E1"]
@@ -0,0 +1,76 @@
+# tests/test_role_propagation.py
+#
+# Role propagation must give employees the same competency rows, with the
+# same required scores, as creating them with the role does.
+import os
+import sys
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from database import Base, create_db_engine  # noqa: E402
+from models import Competency, Department, Employee, EmployeeCompetency, Role, RoleCompetency  # noqa: E402
+from schemas import EmployeeCreateRequest  # noqa: E402
+import employee  # noqa: E402
+import gap_summary  # noqa: E402
+import refdata  # noqa: E402
+import role_propagation  # noqa: E402
+
+HR_USER = {"username": "hr", "role": "HR", "department_code": "HR"}
+
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'propagation.db'}")
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+
+    session.add_all([
+        Department(department_code="IT", name="IT"),
+        Role(role_code="R1", name="Role 1"),
+        Competency(code="C1", name="C1", required_score=3),
+        Competency(code="C2", name="C2", required_score=4),
+    ])
+    session.flush()
+    # C1 is assigned twice: the first assignment (score 4) is the one that counts
+    session.add_all([
+        RoleCompetency(role_code="R1", competency_code="C1", required_score=4),
+        RoleCompetency(role_code="R1", competency_code="C2", required_score=4),
+    ])
+    session.flush()
+    session.add(RoleCompetency(role_code="R1", competency_code="C1", required_score=2))
+    session.add(Employee(
+        employee_number="E1", employee_name="Ann", job_code="J1", reporting_employee_name="Boss",
+        role_code="R1", department_code="IT"
+    ))
+    gap_summary.rebuild(session)
+    session.commit()
+    refdata.refresh(session)
+
+    yield session
+
+    session.close()
+    engine.dispose()
+    refdata._current = None
+
+
+def _required(db, employee_number):
+    return {
+        row.competency_code: row.required_score
+        for row in db.query(EmployeeCompetency).filter(EmployeeCompetency.employee_number == employee_number)
+    }
+
+
+def test_propagation_matches_employee_creation(db):
+    changes = role_propagation.sync_role_employees(db, "R1")
+    db.commit()
+    employee.create_employee(EmployeeCreateRequest(
+        employee_number="E2", employee_name="Bob", job_code="J1", reporting_employee_name="Boss",
+        role_code="R1", department_code="IT"
+    ), db=db, current_user=HR_USER)
+
+    assert changes == {"inserted": 2, "deleted": 0}
+    assert _required(db, "E1") == {"C1": 4, "C2": 4}
+    assert _required(db, "E2") == _required(db, "E1")